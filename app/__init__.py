@@ -12,6 +12,19 @@ def create_app(config_name="default"):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
 
+    # Límite de cuerpo por endpoint, aplicado también a cuerpos chunked
+    from app.utils.helpers import UploadLimitRequest
+
+    app.request_class = UploadLimitRequest
+
+    # Pool con métricas de espera (SQLite usa su propio pool)
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        from app.utils.db_pool import InstrumentedQueuePool
+
+        engine_options = dict(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+        engine_options.setdefault("poolclass", InstrumentedQueuePool)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+
     # Inicializar extensiones
     db.init_app(app)
     migrate.init_app(app, db)
@@ -20,8 +33,36 @@ def create_app(config_name="default"):
     # Registrar blueprints
     from app.routes.auth_routes import auth_bp
     from app.routes.client_routes import client_bp
+    from app.routes.health_routes import health_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api")
     app.register_blueprint(client_bp, url_prefix="/api")
+    app.register_blueprint(health_bp)
+
+    # Cargar la galería de rostros en memoria
+    from app.services.encoding_cache import encoding_cache
+    from app.services.face_gallery import face_gallery
+    from app.services.face_worker_pool import face_worker_pool
+    from app.services.kiosk_tracker import kiosk_tracker
+    from app.services.request_coordinator import verify_coordinator
+
+    face_gallery.init_app(app)
+    face_worker_pool.init_app(app)
+    encoding_cache.init_app(app)
+    kiosk_tracker.init_app(app)
+    verify_coordinator.init_app(app)
+
+    from app.utils.metrics import metrics
+
+    metrics.init_app(app)
+
+    # Modelos, galería y pool listos antes de aceptar tráfico
+    from app.services.warm_up import warm_up
+
+    warm_up.init_app(app)
+
+    from app.commands import register_commands
+
+    register_commands(app)
 
     return app
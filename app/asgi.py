@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.controllers.auth_controller import AuthController
+from app.models.client import Client
+from app.services.client_service import VERIFY_CLIENTS_QUERY
+from app.services.face_gallery import face_gallery
+from app.services.face_recognition_service import FaceRecognitionService
+from app.services.face_worker_pool import WorkerPoolBusyError
+from app.services.request_coordinator import (
+    OverloadedError,
+    RateLimitedError,
+    verify_coordinator,
+)
+from app.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+def _async_database_url(url):
+    """Point the sync psycopg2 URL at the asyncpg driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix) :]
+    return url
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, reason=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.reason = reason
+
+
+class AsyncVerifyApp:
+    """ASGI front end that serves the verify endpoints natively.
+
+    Bodies are read without holding a thread, gallery lookups use an async
+    driver and face extraction runs on an executor, so one process can keep
+    hundreds of slow kiosk connections in flight. Every other route, and
+    multipart uploads, fall through to the Flask app via WsgiToAsgi.
+    """
+
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.max_body = flask_app.config.get("MAX_IMAGE_UPLOAD_BYTES")
+        self.engine = create_async_engine(
+            flask_app.config.get("ASYNC_DATABASE_URL")
+            or _async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"]),
+            pool_size=flask_app.config.get("ASYNC_DB_POOL_SIZE", 10),
+            max_overflow=flask_app.config.get("ASYNC_DB_MAX_OVERFLOW", 10),
+            pool_pre_ping=True,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=flask_app.config.get("ASYNC_EXECUTOR_WORKERS", 16),
+            thread_name_prefix="face-offload",
+        )
+        self.routes = {
+            "/api/verify-access": self.verify_access,
+            "/api/verify-access/batch": self.verify_access_batch,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        handler = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            handler = self.routes.get(scope["path"])
+            if self._content_type(scope).startswith("multipart/"):
+                handler = None
+
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        retry_after = None
+        try:
+            if handler == self.verify_access:
+                # Admisión por kiosco antes de leer el cuerpo
+                verify_coordinator.admit(self._kiosk_id(scope))
+            body = await self._read_body(scope, receive)
+            payload, status = await handler(scope, body)
+        except HTTPError as e:
+            payload, status = {"success": False, "message": e.message}, e.status
+            if e.reason:
+                payload["reason"] = e.reason
+        except RateLimitedError as e:
+            payload, status = {"success": False, "message": str(e)}, 429
+            retry_after = e.retry_after
+        except (WorkerPoolBusyError, OverloadedError) as e:
+            payload, status = {"success": False, "message": str(e)}, 503
+        except Exception as e:
+            logger.exception("Async verify request failed")
+            payload = {"success": False, "message": f"Internal server error: {str(e)}"}
+            status = 500
+
+        await self._send_json(send, payload, status, retry_after)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self._run(face_gallery.ensure_loaded)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    def _content_type(scope):
+        return (AsyncVerifyApp._header(scope, b"content-type") or "").lower()
+
+    async def _read_body(self, scope, receive):
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and self.max_body:
+                if int(value) > self.max_body:
+                    raise HTTPError(413, "Request body too large")
+
+        chunks, total = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            total += len(chunk)
+            if self.max_body and total > self.max_body:
+                raise HTTPError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _send_json(send, payload, status, retry_after=None):
+        body = json.dumps(payload).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if status == 503:
+            retry_after = retry_after or 1
+        if retry_after:
+            headers.append((b"retry-after", str(retry_after).encode()))
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _run(self, fn, *args):
+        """Run sync service code on the executor inside an app context"""
+
+        def call():
+            with self.flask_app.app_context():
+                return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    @staticmethod
+    def _header(scope, header):
+        for name, value in scope.get("headers", []):
+            if name == header:
+                return value.decode("latin-1")
+        return None
+
+    def _parse_images(self, scope, body, field, many):
+        """Return (images, fields); binary bodies take fields from the query"""
+        content_type = self._content_type(scope)
+        if content_type.startswith("application/octet-stream"):
+            fields = self._query(scope)
+            return ([body] if body else []), fields
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body")
+        if not data:
+            raise HTTPError(400, "No data provided")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "JSON body must be an object")
+
+        images = data.get(field)
+        if many:
+            if not images or not isinstance(images, list):
+                raise HTTPError(400, "images must be a non-empty list")
+            return images, data
+        return ([images] if images else []), data
+
+    @staticmethod
+    def _query(scope):
+        return dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+
+    def _kiosk_id(self, scope):
+        return self._header(scope, b"x-kiosk-id") or self._query(scope).get("kiosk_id")
+
+    def _site_id(self, scope, fields):
+        return (
+            fields.get("site_id")
+            or self._query(scope).get("site_id")
+            or self._header(scope, b"x-site-id")
+        )
+
+    async def _fetch_clients(self, client_ids):
+        """Load only the matched clients through the async pool"""
+        if not client_ids:
+            return {}
+        with timed("client_query"):
+            async with self.engine.connect() as connection:
+                result = await connection.execute(
+                    VERIFY_CLIENTS_QUERY, {"ids": list(client_ids)}
+                )
+                rows = result.mappings().all()
+        # Instancias transitorias: solo se usan para to_dict()/is_membership_active()
+        return {row["id"]: Client(**row) for row in rows}
+
+    def _match(self, images, site_id=None):
+        encodings = FaceRecognitionService.extract_face_encodings(images)
+        valid = [i for i, (_, error) in enumerate(encodings) if not error]
+        face_gallery.ensure_loaded()
+        matches = face_gallery.match_many(
+            [encodings[i][0] for i in valid], site=site_id
+        )
+        return encodings, dict(zip(valid, matches)), len(face_gallery)
+
+    def _match_one(self, image, site_id=None):
+        face_gallery.ensure_loaded()
+        match, error = FaceRecognitionService.extract_and_match(
+            image, partial(face_gallery.match, site=site_id, with_distance=True)
+        )
+        return match, error, len(face_gallery)
+
+    async def verify_access(self, scope, body):
+        images, fields = self._parse_images(scope, body, "image", many=False)
+        if not images:
+            raise HTTPError(400, "Image is required")
+
+        site_id = self._site_id(scope, fields)
+        face_selection = (
+            fields.get("face_selection") or self.flask_app.config["FACE_SELECTION_MODE"]
+        )
+        if face_selection:
+            # Varias caras por frame: misma decisión que la ruta Flask
+            return await self._run(
+                verify_coordinator.run,
+                None,
+                partial(
+                    AuthController._verify_multi_face,
+                    images[0],
+                    face_selection,
+                    site_id,
+                ),
+            )
+
+        # Mismo frame en vuelo: un solo cálculo, dentro del tope de concurrencia;
+        # los que esperan lo hacen en el event loop, sin ocupar hilos
+        match, error, gallery_size = await verify_coordinator.run_async(
+            verify_coordinator.key_for(images[0], site_id),
+            partial(self._match_one, images[0], site_id),
+            self._run,
+        )
+
+        if error:
+            raise HTTPError(400, error, FaceRecognitionService.error_reason(error))
+        if not gallery_size:
+            raise HTTPError(404, "No clients registered with facial recognition")
+
+        client_id, confidence, _ = match
+        clients = await self._fetch_clients({client_id} - {None})
+        return AuthController._access_result(clients.get(client_id), confidence), 200
+
+    async def verify_access_batch(self, scope, body):
+        images, fields = self._parse_images(scope, body, "images", many=True)
+        max_images = self.flask_app.config["FACE_BATCH_MAX_IMAGES"]
+        if len(images) > max_images:
+            raise HTTPError(400, f"A batch may contain at most {max_images} images")
+
+        encodings, matches, gallery_size = await self._run(
+            self._match, images, self._site_id(scope, fields)
+        )
+        if not gallery_size:
+            raise HTTPError(404, "No clients registered with facial recognition")
+
+        clients = await self._fetch_clients(
+            {client_id for client_id, _ in matches.values() if client_id is not None}
+        )
+
+        results = []
+        for i, (_, error) in enumerate(encodings):
+            if error:
+                results.append(
+                    {
+                        "index": i,
+                        "success": False,
+                        "message": error,
+                        "reason": FaceRecognitionService.error_reason(error),
+                    }
+                )
+                continue
+            client_id, confidence = matches[i]
+            result = AuthController._access_result(clients.get(client_id), confidence)
+            results.append({"index": i, **result})
+
+        return {"success": True, "results": results}, 200
+
+
+def create_asgi_app(flask_app):
+    return AsyncVerifyApp(flask_app)
@@ -0,0 +1,282 @@
+import os
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, select, true, update
+
+from app import db
+from app.models.client import Client
+from app.services.encoding_codec import PRECISION, EncodingCodec
+
+encodings_cli = AppGroup("encodings", help="Face encoding storage maintenance.")
+clients_cli = AppGroup("clients", help="Client administration.")
+gallery_cli = AppGroup("gallery", help="Face gallery maintenance.")
+
+# Originales guardados por "encodings migrate" para "encodings check-accuracy"
+ACCURACY_SAMPLE_PATH = "instance/encoding_accuracy_sample.npz"
+
+
+def _iter_encoding_batches(batch_size):
+    """Keyset scan over (id, face_encoding), one short transaction per batch"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Client.id, Client.face_encoding)
+            .where(Client.face_encoding.isnot(None), Client.id > last_id)
+            .order_by(Client.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _publish_gallery():
+    """Hand CLI writes to the running workers through a new snapshot"""
+    from app.services.face_gallery import face_gallery
+
+    if not current_app.config.get("FACE_SNAPSHOT_DIR"):
+        click.echo(
+            "FACE_SNAPSHOT_DIR is not set: restart the server so its workers "
+            "reload the gallery"
+        )
+        return
+    face_gallery.publish_from_db()
+    click.echo(f"Published a gallery snapshot with {len(face_gallery)} encodings")
+
+
+@encodings_cli.command("migrate")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option(
+    "--format",
+    "encoding_format",
+    type=click.Choice(["float32", "int8"]),
+    default=None,
+    help="Target format (defaults to FACE_ENCODING_FORMAT).",
+)
+@click.option(
+    "--sample-file",
+    default=ACCURACY_SAMPLE_PATH,
+    show_default=True,
+    help="Where to keep originals of lossy rewrites for check-accuracy.",
+)
+@click.option("--sample", default=1000, show_default=True)
+def migrate_encodings(batch_size, encoding_format, sample_file, sample):
+    """Rewrite legacy float64 encodings in the compact versioned format.
+
+    When the rewrite loses precision, the originals of the first --sample
+    rows are saved to --sample-file so check-accuracy can still measure
+    the error afterwards. Publishes a new gallery snapshot when done;
+    without FACE_SNAPSHOT_DIR the server must be restarted to serve the
+    rewritten encodings.
+    """
+    encoding_format = encoding_format or current_app.config["FACE_ENCODING_FORMAT"]
+    statement = (
+        update(Client.__table__)
+        .where(Client.__table__.c.id == bindparam("row_id"))
+        .values(face_encoding=bindparam("encoding"))
+    )
+
+    migrated = 0
+    sample_ids, sample_vectors = [], []
+    for rows in _iter_encoding_batches(batch_size):
+        params = []
+        for row in rows:
+            current_format = EncodingCodec.format_of(row.face_encoding)
+            if current_format == encoding_format:
+                continue
+            vector = EncodingCodec.decode(row.face_encoding, np.float64)
+            if (
+                PRECISION[current_format] > PRECISION[encoding_format]
+                and len(sample_ids) < sample
+            ):
+                sample_ids.append(row.id)
+                sample_vectors.append(vector)
+            params.append(
+                {
+                    "row_id": row.id,
+                    "encoding": EncodingCodec.encode(vector, encoding_format),
+                }
+            )
+        if params:
+            db.session.execute(statement, params)
+        db.session.commit()
+        migrated += len(params)
+        click.echo(f"Migrated {migrated} encodings (last id {rows[-1].id})")
+
+    click.echo(f"Done: {migrated} encodings rewritten as {encoding_format}")
+    if sample_ids:
+        os.makedirs(os.path.dirname(sample_file) or ".", exist_ok=True)
+        np.savez(
+            sample_file, ids=np.array(sample_ids), vectors=np.vstack(sample_vectors)
+        )
+        click.echo(f"Kept {len(sample_ids)} originals in {sample_file}")
+    if migrated:
+        _publish_gallery()
+
+
+def _stored_against_originals(sample_file, encoding_format):
+    """(originals, stored) for sampled rows now stored in encoding_format"""
+    with np.load(sample_file) as data:
+        originals = dict(zip(data["ids"].tolist(), data["vectors"]))
+    rows = db.session.execute(
+        select(Client.id, Client.face_encoding).where(
+            Client.id.in_(list(originals)), Client.face_encoding.isnot(None)
+        )
+    )
+    pairs = [
+        (originals[row.id], EncodingCodec.decode(row.face_encoding, np.float64))
+        for row in rows
+        if EncodingCodec.format_of(row.face_encoding) == encoding_format
+    ]
+    if not pairs:
+        return [], []
+    return zip(*pairs)
+
+
+@encodings_cli.command("check-accuracy")
+@click.option("--sample", default=1000, show_default=True)
+@click.option("--format", "encoding_format", default="int8", show_default=True)
+@click.option("--sample-file", default=ACCURACY_SAMPLE_PATH, show_default=True)
+def check_accuracy(sample, encoding_format, sample_file):
+    """Measure the distance error a compact format introduces.
+
+    Rows stored in a more precise format are round-tripped through the
+    target one. Once they are all migrated, the originals kept by
+    "encodings migrate" are compared with what is actually stored.
+    """
+    from app.services.face_recognition_service import FaceRecognitionService
+
+    vectors, compact = [], None
+    for rows in _iter_encoding_batches(500):
+        for row in rows:
+            current_format = EncodingCodec.format_of(row.face_encoding)
+            if PRECISION[current_format] > PRECISION[encoding_format]:
+                vectors.append(EncodingCodec.decode(row.face_encoding, np.float64))
+        if len(vectors) >= sample:
+            break
+    vectors = vectors[:sample]
+
+    if len(vectors) < 2 and os.path.exists(sample_file):
+        vectors, compact = _stored_against_originals(sample_file, encoding_format)
+        click.echo(f"Comparing stored {encoding_format} rows with {sample_file}")
+
+    if len(vectors) < 2:
+        click.echo(
+            f"Not enough encodings more precise than {encoding_format} to compare"
+        )
+        return
+
+    report = EncodingCodec.accuracy_report(
+        np.vstack(vectors),
+        encoding_format,
+        FaceRecognitionService.get_tolerance(),
+        compact=None if compact is None else np.vstack(compact),
+    )
+    for key, value in report.items():
+        click.echo(f"{key}: {value}")
+
+
+@clients_cli.command("bulk-enroll")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--report",
+    "report_path",
+    type=click.Path(dir_okay=False, writable=True),
+    default="bulk_enroll_report.csv",
+    show_default=True,
+)
+@click.option("--chunk-size", type=int, default=None, help="Rows per INSERT.")
+@click.option("--workers", type=int, default=None, help="Extraction processes.")
+@click.option("--start-row", type=int, default=0, help="Skip the first N rows.")
+def bulk_enroll(source, report_path, chunk_size, workers, start_row):
+    """Create clients from a ZIP (manifest.csv + photos) or a CSV manifest.
+
+    Re-running the same file after a failure resumes it: rows whose email
+    already exists are reported as skipped. Publishes a new gallery
+    snapshot when done; without FACE_SNAPSHOT_DIR the server must be
+    restarted to recognise the new members.
+    """
+    from app.services.bulk_enrollment_service import BulkEnrollmentService
+
+    rows, load_photo = BulkEnrollmentService.open_source(source)
+    report = BulkEnrollmentService.enroll(
+        rows, load_photo, chunk_size=chunk_size, workers=workers, start_row=start_row
+    )
+    with open(report_path, "w", newline="") as stream:
+        BulkEnrollmentService.write_report(report, stream)
+
+    summary = BulkEnrollmentService.summarize(report)
+    click.echo(
+        f"Done: {summary['created']} created, {summary['skipped']} skipped, "
+        f"{summary['error']} errors (report in {report_path})"
+    )
+    if summary["created"]:
+        _publish_gallery()
+
+
+@clients_cli.command("find-duplicates")
+@click.option("--threshold", type=float, default=None, help="Max face distance.")
+@click.option("--block-size", default=2048, show_default=True)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default="duplicate_clusters.csv",
+    show_default=True,
+)
+def find_duplicates(threshold, block_size, output):
+    """Find clusters of active clients enrolled with the same face."""
+    import csv
+
+    from app.services.duplicate_detection import DuplicateFaceService
+
+    threshold = threshold or DuplicateFaceService.get_threshold()
+    ids, vectors = [], []
+    for row in db.session.execute(
+        select(Client.id, Client.face_encoding).where(
+            Client.active == true(), Client.face_encoding.isnot(None)
+        )
+    ):
+        ids.append(row.id)
+        vectors.append(EncodingCodec.decode(row.face_encoding))
+
+    if len(ids) < 2:
+        click.echo("Not enough encodings to compare")
+        return
+
+    clusters = DuplicateFaceService.find_clusters(
+        ids, np.vstack(vectors), threshold, block_size
+    )
+    emails = dict(
+        db.session.execute(
+            select(Client.id, Client.email).where(
+                Client.id.in_([i for members in clusters for i in members])
+            )
+        ).all()
+    )
+    with open(output, "w", newline="") as stream:
+        writer = csv.writer(stream)
+        writer.writerow(["cluster", "client_id", "email"])
+        for number, members in enumerate(clusters, start=1):
+            for client_id in members:
+                writer.writerow([number, client_id, emails.get(client_id)])
+
+    click.echo(
+        f"Found {len(clusters)} duplicate clusters among {len(ids)} clients "
+        f"(report in {output})"
+    )
+
+
+@gallery_cli.command("publish")
+def publish_gallery():
+    """Rebuild the shared gallery snapshot from the clients table."""
+    _publish_gallery()
+
+
+def register_commands(app):
+    app.cli.add_command(encodings_cli)
+    app.cli.add_command(clients_cli)
+    app.cli.add_command(gallery_cli)
@@ -1,22 +1,99 @@
-from flask import jsonify, request
+import zipfile
+from functools import partial
 
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.services.bulk_enrollment_service import BulkEnrollmentService
 from app.services.client_service import ClientService
-from app.services.face_recognition_service import FaceRecognitionService
+from app.services.duplicate_detection import DuplicateFaceService
+from app.services.face_gallery import face_gallery
+from app.services.face_recognition_service import (
+    NO_FACE_ERROR,
+    QUALITY_REASONS,
+    FaceRecognitionService,
+)
+from app.services.face_worker_pool import WorkerPoolBusyError
+from app.services.kiosk_tracker import kiosk_tracker
+from app.services.request_coordinator import (
+    OverloadedError,
+    RateLimitedError,
+    verify_coordinator,
+)
+from app.utils.helpers import BODY_TOO_LARGE_ERROR, RequestHelper
+from app.utils.metrics import metrics
+
+ACCESS_DECISIONS = metrics.counter(
+    "face_access_decisions_total", "Access decisions by outcome.", ["result"]
+)
 
 
 class AuthController:
+    @staticmethod
+    def _access_result(best_match, best_confidence):
+        """Build the access decision for one matched (or unmatched) face"""
+        if best_match:
+            if best_match.is_membership_active():
+                ACCESS_DECISIONS.inc(result="granted")
+                return {
+                    "success": True,
+                    "access_granted": True,
+                    "message": f"Welcome {best_match.name}!",
+                    "client": best_match.to_dict(),
+                    "confidence": round(best_confidence, 2),
+                }
+            ACCESS_DECISIONS.inc(result="expired")
+            return {
+                "success": True,
+                "access_granted": False,
+                "message": f"Hello {best_match.name}, your membership has expired. Please contact reception.",
+                "client": best_match.to_dict(),
+                "confidence": round(best_confidence, 2),
+            }
+        ACCESS_DECISIONS.inc(result="not_recognized")
+        return {
+            "success": True,
+            "access_granted": False,
+            "message": "Face not recognized. Access denied.",
+            "client": None,
+        }
+
+    @staticmethod
+    def _error_payload(error):
+        """Failure body with the message and a reason code the kiosk can act on"""
+        return {
+            "success": False,
+            "message": error,
+            "reason": FaceRecognitionService.error_reason(error),
+        }
+
+    @staticmethod
+    def _extraction_error(error):
+        return jsonify(AuthController._error_payload(error)), 400
+
+    @staticmethod
+    def _duplicate_response(duplicate):
+        return jsonify(
+            {
+                "success": False,
+                "message": f"This face is already enrolled as client {duplicate['client_id']}",
+                "duplicate_of": duplicate,
+            }
+        ), 409
+
     @staticmethod
     def create_client_with_face():
         try:
-            data = request.get_json()
+            data, image_data, error = RequestHelper.get_image_payload()
 
-            if not data:
-                return jsonify({"success": False, "message": "No data provided"}), 400
+            if error:
+                return jsonify(
+                    {"success": False, "message": error}
+                ), RequestHelper.payload_error_status(error)
 
             name = data.get("name")
             email = data.get("email")
             expiration_date = data.get("expiration_date")
-            image_data = data.get("image")
 
             if not all([name, email, expiration_date, image_data]):
                 return jsonify(
@@ -44,11 +121,16 @@ class AuthController:
                     {"success": False, "message": f"Face registration failed: {error}"}
                 ), 400
 
+            duplicate = DuplicateFaceService.find_duplicate(face_encoding)
+            if duplicate and DuplicateFaceService.get_action() == "reject":
+                return AuthController._duplicate_response(duplicate)
+
             client, db_error = ClientService.create_client(
                 name=name,
                 email=email,
                 expiration_date=expiration_date,
                 face_encoding=face_encoding,
+                home_site=data.get("home_site"),
             )
 
             if db_error:
@@ -56,13 +138,76 @@ class AuthController:
                     {"success": False, "message": f"Database error: {db_error}"}
                 ), 500
 
+            response = {
+                "success": True,
+                "message": f"Client {client.name} created successfully with facial recognition",
+                "client": client.to_dict(),
+            }
+            if duplicate:
+                response["possible_duplicate"] = duplicate
+            return jsonify(response), 201
+
+        except WorkerPoolBusyError as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                503,
+                {"Retry-After": "1"},
+            )
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Internal server error: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def bulk_enroll_clients():
+        """Start a bulk enrollment job from a ZIP with manifest.csv and the photos"""
+        try:
+            try:
+                upload = request.files.get("file")
+            except RequestEntityTooLarge:
+                return jsonify({"success": False, "message": BODY_TOO_LARGE_ERROR}), 413
+
+            if not upload:
+                return jsonify(
+                    {
+                        "success": False,
+                        "message": "A ZIP file with manifest.csv and photos is required",
+                    }
+                ), 400
+
+            try:
+                job_id = BulkEnrollmentService.start_job(upload)
+            except (KeyError, zipfile.BadZipFile) as e:
+                return jsonify(
+                    {"success": False, "message": f"Invalid bulk file: {str(e)}"}
+                ), 400
+
             return jsonify(
                 {
                     "success": True,
-                    "message": f"Client {client.name} created successfully with facial recognition",
-                    "client": client.to_dict(),
+                    "message": "Bulk enrollment started",
+                    "job_id": job_id,
+                    "status": "queued",
                 }
-            ), 201
+            ), 202
+
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Internal server error: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def bulk_enroll_status(job_id):
+        """State of a bulk enrollment job, with its report once done"""
+        try:
+            job = BulkEnrollmentService.get_job(job_id)
+
+            if job is None:
+                return jsonify(
+                    {"success": False, "message": "Bulk enrollment job not found"}
+                ), 404
+
+            return jsonify({"success": True, **job}), 200
 
         except Exception as e:
             return jsonify(
@@ -72,13 +217,14 @@ class AuthController:
     @staticmethod
     def register_face():
         try:
-            data = request.get_json()
+            data, image_data, error = RequestHelper.get_image_payload()
 
-            if not data:
-                return jsonify({"success": False, "message": "No data provided"}), 400
+            if error:
+                return jsonify(
+                    {"success": False, "message": error}
+                ), RequestHelper.payload_error_status(error)
 
             client_id = data.get("client_id")
-            image_data = data.get("image")
 
             if not client_id or not image_data:
                 return jsonify(
@@ -96,6 +242,12 @@ class AuthController:
             if error:
                 return jsonify({"success": False, "message": error}), 400
 
+            duplicate = DuplicateFaceService.find_duplicate(
+                face_encoding, exclude_client_id=client.id
+            )
+            if duplicate and DuplicateFaceService.get_action() == "reject":
+                return AuthController._duplicate_response(duplicate)
+
             updated_client, db_error = ClientService.update_client_face_encoding(
                 client_id, face_encoding
             )
@@ -105,35 +257,194 @@ class AuthController:
                     {"success": False, "message": f"Database error: {db_error}"}
                 ), 500
 
-            return jsonify(
-                {
-                    "success": True,
-                    "message": f"Face registered successfully for {client.name}",
-                    "client": updated_client.to_dict(),
-                }
-            ), 200
-
+            response = {
+                "success": True,
+                "message": f"Face registered successfully for {client.name}",
+                "client": updated_client.to_dict(),
+            }
+            if duplicate:
+                response["possible_duplicate"] = duplicate
+            return jsonify(response), 200
+
+        except WorkerPoolBusyError as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                503,
+                {"Retry-After": "1"},
+            )
         except Exception as e:
             return jsonify(
                 {"success": False, "message": f"Internal server error: {str(e)}"}
             ), 500
 
+    @staticmethod
+    def _site_id(data):
+        """Site of the gate, used to match against its members first"""
+        return (
+            data.get("site_id")
+            or request.args.get("site_id")
+            or request.headers.get("X-Site-Id")
+        )
+
+    @staticmethod
+    def _verify_multi_face(image_data, face_selection, site_id=None):
+        """Match every face in the frame and decide on the selected subject;
+        returns (payload, status)"""
+        if face_selection not in ("largest", "center"):
+            return {
+                "success": False,
+                "message": "face_selection must be 'largest' or 'center'",
+            }, 400
+
+        faces, subject, error = FaceRecognitionService.extract_all_face_encodings(
+            image_data, face_selection
+        )
+
+        if error:
+            return AuthController._error_payload(error), 400
+
+        face_gallery.ensure_loaded()
+
+        if not len(face_gallery):
+            return {
+                "success": False,
+                "message": "No clients registered with facial recognition",
+            }, 404
+
+        matches = face_gallery.match_many(
+            [face["encoding"] for face in faces], site=site_id
+        )
+        clients = ClientService.get_clients_for_verification(
+            {client_id for client_id, _ in matches if client_id is not None}
+        )
+
+        results = [
+            {
+                "box": list(face["box"]),
+                "subject": i == subject,
+                **AuthController._access_result(clients.get(client_id), confidence),
+            }
+            for i, (face, (client_id, confidence)) in enumerate(zip(faces, matches))
+        ]
+        client_id, confidence = matches[subject]
+
+        return {
+            **AuthController._access_result(clients.get(client_id), confidence),
+            "faces": results,
+        }, 200
+
+    @staticmethod
+    def _verify_single(image_data, site_id):
+        """Extract, match and look up one probe; returns (payload, status)"""
+        face_gallery.ensure_loaded()
+        match, error = FaceRecognitionService.extract_and_match(
+            image_data,
+            partial(face_gallery.match, site=site_id, with_distance=True),
+        )
+
+        if error:
+            return AuthController._error_payload(error), 400
+
+        if not len(face_gallery):
+            return {
+                "success": False,
+                "message": "No clients registered with facial recognition",
+            }, 404
+
+        client_id, best_confidence, _ = match
+
+        best_match = ClientService.get_clients_for_verification(
+            {client_id} - {None}
+        ).get(client_id)
+
+        return AuthController._access_result(best_match, best_confidence), 200
+
     @staticmethod
     def verify_access():
         try:
-            data = request.get_json()
+            # Admisión por kiosco antes de leer el cuerpo
+            verify_coordinator.admit(
+                request.headers.get("X-Kiosk-Id") or request.args.get("kiosk_id")
+            )
 
-            if not data:
-                return jsonify({"success": False, "message": "No data provided"}), 400
+            data, image_data, error = RequestHelper.get_image_payload()
 
-            image_data = data.get("image")
+            if error:
+                return jsonify(
+                    {"success": False, "message": error}
+                ), RequestHelper.payload_error_status(error)
 
             if not image_data:
                 return jsonify({"success": False, "message": "Image is required"}), 400
 
-            clients_with_faces = ClientService.get_all_clients()
+            site_id = AuthController._site_id(data)
+            face_selection = (
+                data.get("face_selection") or current_app.config["FACE_SELECTION_MODE"]
+            )
+            if face_selection:
+                payload, status = verify_coordinator.run(
+                    None,
+                    partial(
+                        AuthController._verify_multi_face,
+                        image_data,
+                        face_selection,
+                        site_id,
+                    ),
+                )
+                return jsonify(payload), status
+
+            # Mismo frame en vuelo (reintentos, kioscos duplicados): un solo cálculo
+            payload, status = verify_coordinator.run(
+                verify_coordinator.key_for(image_data, site_id),
+                partial(AuthController._verify_single, image_data, site_id),
+            )
+            return jsonify(payload), status
 
-            if not clients_with_faces:
+        except RateLimitedError as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                429,
+                {"Retry-After": str(e.retry_after)},
+            )
+        except (WorkerPoolBusyError, OverloadedError) as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                503,
+                {"Retry-After": "1"},
+            )
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Internal server error: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def verify_access_batch():
+        """Verify several frames or gates in one request"""
+        try:
+            data, images, error = RequestHelper.get_image_payload("images", many=True)
+
+            if error:
+                return jsonify(
+                    {"success": False, "message": error}
+                ), RequestHelper.payload_error_status(error)
+
+            if not images or not isinstance(images, list):
+                return jsonify(
+                    {"success": False, "message": "images must be a non-empty list"}
+                ), 400
+
+            max_images = current_app.config["FACE_BATCH_MAX_IMAGES"]
+            if len(images) > max_images:
+                return jsonify(
+                    {
+                        "success": False,
+                        "message": f"A batch may contain at most {max_images} images",
+                    }
+                ), 400
+
+            face_gallery.ensure_loaded()
+
+            if not len(face_gallery):
                 return jsonify(
                     {
                         "success": False,
@@ -141,52 +452,136 @@ class AuthController:
                     }
                 ), 404
 
-            best_match = None
-            best_confidence = 0
+            extracted = FaceRecognitionService.extract_face_encodings(images)
+            valid = [i for i, (encoding, error) in enumerate(extracted) if not error]
 
-            for client in clients_with_faces:
-                is_match, confidence, error = FaceRecognitionService.compare_faces(
-                    client.face_encoding, image_data
-                )
+            matches = face_gallery.match_many(
+                [extracted[i][0] for i in valid], site=AuthController._site_id(data)
+            )
+            matches_by_image = dict(zip(valid, matches))
 
+            clients = ClientService.get_clients_for_verification(
+                {client_id for client_id, _ in matches if client_id is not None}
+            )
+
+            results = []
+            for i, (encoding, error) in enumerate(extracted):
                 if error:
+                    results.append(
+                        {
+                            "index": i,
+                            "success": False,
+                            "message": error,
+                            "reason": FaceRecognitionService.error_reason(error),
+                        }
+                    )
                     continue
 
-                if is_match and confidence > best_confidence:
-                    best_match = client
-                    best_confidence = confidence
+                client_id, confidence = matches_by_image[i]
+                result = AuthController._access_result(
+                    clients.get(client_id), confidence
+                )
+                results.append({"index": i, **result})
 
-            if best_match:
-                if best_match.is_membership_active():
-                    return jsonify(
-                        {
-                            "success": True,
-                            "access_granted": True,
-                            "message": f"Welcome {best_match.name}!",
-                            "client": best_match.to_dict(),
-                            "confidence": round(best_confidence, 2),
-                        }
-                    ), 200
-                else:
+            return jsonify({"success": True, "results": results}), 200
+
+        except WorkerPoolBusyError as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                503,
+                {"Retry-After": "1"},
+            )
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Internal server error: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def verify_access_stream():
+        """Verify a kiosk video stream one frame at a time"""
+        try:
+            data, image_data, error = RequestHelper.get_image_payload()
+
+            if error:
+                return jsonify(
+                    {"success": False, "message": error}
+                ), RequestHelper.payload_error_status(error)
+
+            kiosk_id = data.get("kiosk_id") or request.headers.get("X-Kiosk-Id")
+
+            if not kiosk_id or not image_data:
+                return jsonify(
+                    {"success": False, "message": "kiosk_id and image are required"}
+                ), 400
+
+            box, thumb, last_match = kiosk_tracker.snapshot(kiosk_id)
+
+            result, error = FaceRecognitionService.track_frame(image_data, box, thumb)
+
+            if error == NO_FACE_ERROR:
+                # La persona salió del encuadre: empieza un track nuevo
+                kiosk_tracker.reset(kiosk_id)
+                return jsonify(
+                    {"success": True, "status": "no_face", "message": error}
+                ), 200
+
+            if error:
+                reason = FaceRecognitionService.error_reason(error)
+                if reason in QUALITY_REASONS:
+                    # Frame inútil: se descarta sin cortar el track en curso
                     return jsonify(
                         {
                             "success": True,
-                            "access_granted": False,
-                            "message": f"Hello {best_match.name}, your membership has expired. Please contact reception.",
-                            "client": best_match.to_dict(),
-                            "confidence": round(best_confidence, 2),
+                            "status": "low_quality",
+                            "reason": reason,
+                            "message": error,
                         }
                     ), 200
+                return AuthController._extraction_error(error)
+
+            encoded = result["encoding"] is not None
+            if encoded:
+                face_gallery.ensure_loaded()
+                match = face_gallery.match(
+                    result["encoding"], site=AuthController._site_id(data)
+                )
+            elif last_match is None:
+                match = (None, 0.0)
             else:
-                return jsonify(
-                    {
-                        "success": True,
-                        "access_granted": False,
-                        "message": "Face not recognized. Access denied.",
-                        "client": None,
-                    }
-                ), 200
+                match = last_match
+
+            track, decision = kiosk_tracker.record(
+                kiosk_id, result["box"], result["thumb"], match, encoded
+            )
+            progress = {
+                "frames": track.frames,
+                "encoded_frames": track.encoded_frames,
+                "reused": not encoded,
+            }
+
+            if decision is None:
+                status = "decided" if track.decided else "tracking"
+                return jsonify({"success": True, "status": status, **progress}), 200
+
+            client_id, confidence = decision
+            client = ClientService.get_clients_for_verification(
+                {client_id} - {None}
+            ).get(client_id)
 
+            return jsonify(
+                {
+                    **AuthController._access_result(client, confidence),
+                    "status": "decision",
+                    **progress,
+                }
+            ), 200
+
+        except WorkerPoolBusyError as e:
+            return (
+                jsonify({"success": False, "message": str(e)}),
+                503,
+                {"Retry-After": "1"},
+            )
         except Exception as e:
             return jsonify(
                 {"success": False, "message": f"Internal server error: {str(e)}"}
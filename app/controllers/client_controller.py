@@ -1,23 +1,74 @@
+import json
 from datetime import datetime
 
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
 
+from app import db
 from app.services.client_service import ClientService
 
 
 class ClientController:
+    @staticmethod
+    def _parse_bool_arg(name):
+        value = request.args.get(name)
+        if value is None:
+            return None
+        if value.lower() in ("true", "1", "yes"):
+            return True
+        if value.lower() in ("false", "0", "no"):
+            return False
+        raise ValueError(f"{name} must be true or false")
+
+    @staticmethod
+    def _stream_clients(filters, batch_size=500):
+        """NDJSON export: one client per line, fetched in keyset batches"""
+        after_id = None
+        while True:
+            rows = ClientService.list_clients(
+                after_id=after_id, limit=batch_size, **filters
+            ).all()
+            for client, has_face in rows:
+                yield json.dumps({**client.to_dict(), "has_face": has_face}) + "\n"
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0].id
+            # Liberar los objetos ya enviados antes del siguiente lote
+            db.session.expunge_all()
+
     @staticmethod
     def get_all_clients():
-        """Get all clients"""
+        """Get clients, one keyset page at a time (or all of them as NDJSON)"""
         try:
-            clients = ClientService.get_all_clients()
+            try:
+                cursor = request.args.get("cursor", type=int)
+                limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+                filters = {
+                    "active": ClientController._parse_bool_arg("active"),
+                    "expired": ClientController._parse_bool_arg("expired"),
+                    "has_face": ClientController._parse_bool_arg("has_face"),
+                }
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+
+            if request.args.get("format") == "ndjson":
+                return Response(
+                    stream_with_context(ClientController._stream_clients(filters)),
+                    mimetype="application/x-ndjson",
+                )
+
+            rows = ClientService.list_clients(
+                after_id=cursor, limit=limit, **filters
+            ).all()
+            next_cursor = rows[-1][0].id if len(rows) == limit else None
+
             return jsonify(
                 {
                     "success": True,
                     "clients": [
-                        {**client.to_dict(), "has_face": bool(client.face_encoding)}
-                        for client in clients
+                        {**client.to_dict(), "has_face": has_face}
+                        for client, has_face in rows
                     ],
+                    "next_cursor": next_cursor,
                 }
             ), 200
         except Exception as e:
@@ -72,6 +123,7 @@ class ClientController:
                 email=email,
                 expiration_date=expiration_date,
                 face_encoding=None,
+                home_site=data.get("home_site"),
             )
 
             if error:
@@ -0,0 +1,40 @@
+from flask import Response, jsonify
+
+from app.utils.db_pool import pool_monitor
+from app.services.warm_up import warm_up
+from app.utils.metrics import metrics
+
+
+class HealthController:
+    @staticmethod
+    def db_pool_stats():
+        """Connection pool checkout waits and saturation"""
+        try:
+            return jsonify({"success": True, "pool": pool_monitor.stats()}), 200
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Error reading pool stats: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def metrics():
+        """All registered metrics in the Prometheus text format"""
+        try:
+            return Response(metrics.render(), mimetype="text/plain; version=0.0.4"), 200
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Error rendering metrics: {str(e)}"}
+            ), 500
+
+    @staticmethod
+    def readiness():
+        """200 once models, gallery and workers are warm, 503 before"""
+        try:
+            status = warm_up.status()
+            return jsonify({"success": status["ready"], **status}), 200 if status[
+                "ready"
+            ] else 503
+        except Exception as e:
+            return jsonify(
+                {"success": False, "message": f"Error reading readiness: {str(e)}"}
+            ), 500
@@ -1,17 +1,33 @@
 from app import db
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import BYTEA
+from sqlalchemy.orm import deferred
 
 
 class Client(db.Model):
     __tablename__ = "clients"
+    __table_args__ = (
+        # Índice parcial para la consulta de la galería de rostros
+        db.Index(
+            "ix_clients_gallery",
+            "active",
+            "expiration_date",
+            postgresql_where=db.text("face_encoding IS NOT NULL"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     active = db.Column(db.Boolean, default=True, nullable=False)
     expiration_date = db.Column(db.Date, nullable=False)
-    face_encoding = db.Column(BYTEA, nullable=True)
+    # Sede habitual del socio: los torniquetes de esa sede lo buscan primero
+    home_site = db.Column(db.String(50), nullable=True, index=True)
+    # El blob solo se carga cuando se accede explícitamente; BYTEA en
+    # PostgreSQL y BLOB en SQLite (benchmarks)
+    face_encoding = deferred(
+        db.Column(db.LargeBinary().with_variant(BYTEA, "postgresql"), nullable=True)
+    )
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -29,6 +45,7 @@ class Client(db.Model):
             "expiration_date": self.expiration_date.isoformat()
             if self.expiration_date
             else None,
+            "home_site": self.home_site,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
@@ -1,10 +1,20 @@
-from flask import Blueprint
+from flask import Blueprint, jsonify, request
 
 from app.controllers.auth_controller import AuthController
+from app.utils.helpers import BODY_TOO_LARGE_ERROR
 
 auth_bp = Blueprint("auth", __name__)
 
 
+@auth_bp.before_request
+def limit_upload_size():
+    """Reject oversized uploads before reading the body"""
+    # El mismo límite se aplica al leer los cuerpos sin Content-Length
+    max_length = request.max_content_length
+    if max_length and request.content_length and request.content_length > max_length:
+        return jsonify({"success": False, "message": BODY_TOO_LARGE_ERROR}), 413
+
+
 @auth_bp.route("/register-face", methods=["POST"])
 def register_face():
     return AuthController.register_face()
@@ -15,6 +25,26 @@ def verify_access():
     return AuthController.verify_access()
 
 
+@auth_bp.route("/verify-access/batch", methods=["POST"])
+def verify_access_batch():
+    return AuthController.verify_access_batch()
+
+
+@auth_bp.route("/verify-access/stream", methods=["POST"])
+def verify_access_stream():
+    return AuthController.verify_access_stream()
+
+
 @auth_bp.route("/clients/with-face", methods=["POST"])
 def create_client_with_face():
     return AuthController.create_client_with_face()
+
+
+@auth_bp.route("/clients/bulk", methods=["POST"])
+def bulk_enroll_clients():
+    return AuthController.bulk_enroll_clients()
+
+
+@auth_bp.route("/clients/bulk/<job_id>", methods=["GET"])
+def bulk_enroll_status(job_id):
+    return AuthController.bulk_enroll_status(job_id)
@@ -0,0 +1,23 @@
+from flask import Blueprint
+
+from app.controllers.health_controller import HealthController
+
+health_bp = Blueprint("health", __name__)
+
+
+@health_bp.route("/health/db", methods=["GET"])
+def db_pool_stats():
+    """Database pool statistics"""
+    return HealthController.db_pool_stats()
+
+
+@health_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return HealthController.metrics()
+
+
+@health_bp.route("/ready", methods=["GET"])
+def readiness():
+    """Readiness probe: ready only after the warm-up phase"""
+    return HealthController.readiness()
@@ -0,0 +1,204 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index written in NumPy.
+
+    A k-means coarse quantizer splits the gallery into ``nlist`` cells. A
+    search scans only the ``nprobe`` cells closest to the probe, ranks those
+    candidates on a compact float16 copy and hands the ``rerank_k`` best ids
+    back to the gallery for an exact re-rank. ``nprobe`` is the recall/latency
+    knob: higher values scan more cells.
+    """
+
+    def __init__(
+        self,
+        nlist=0,
+        nprobe=8,
+        rerank_k=32,
+        min_size=10000,
+        kmeans_iterations=10,
+        path=None,
+        seed=0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rerank_k = rerank_k
+        self.min_size = min_size
+        self.kmeans_iterations = kmeans_iterations
+        self.path = path
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._list_ids = []
+        self._list_vectors = []
+        self._id_to_list = {}
+
+    @property
+    def ready(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._id_to_list)
+
+    def _auto_nlist(self, n):
+        if self.nlist:
+            return min(self.nlist, n)
+        return int(min(4096, max(16, 4 * np.sqrt(n))))
+
+    @staticmethod
+    def _nearest_centroids(vectors, centroids, batch_size=8192):
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            chunk = vectors[start : start + batch_size]
+            scores = centroid_norms - 2 * (chunk @ centroids.T)
+            labels[start : start + batch_size] = np.argmin(scores, axis=1)
+        return labels
+
+    def train(self, encodings):
+        """Fit the coarse quantizer with a few Lloyd iterations"""
+        encodings = np.asarray(encodings, dtype=np.float32)
+        nlist = self._auto_nlist(len(encodings))
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(len(encodings), max(nlist * 64, 20000), 100000)
+        sample = encodings[rng.choice(len(encodings), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = self._nearest_centroids(sample, centroids)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            non_empty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[non_empty] = sums / counts[non_empty, None]
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+
+        self.centroids = centroids
+        self.trained_size = len(encodings)
+
+    def _populate(self, ids, encodings, labels):
+        nlist = len(self.centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        sorted_ids = ids[order]
+        sorted_vectors = encodings[order].astype(np.float16)
+        self._list_ids = [sorted_ids[bounds[i] : bounds[i + 1]] for i in range(nlist)]
+        self._list_vectors = [
+            sorted_vectors[bounds[i] : bounds[i + 1]] for i in range(nlist)
+        ]
+        self._id_to_list = dict(zip(sorted_ids.tolist(), labels[order].tolist()))
+
+    def build(self, ids, encodings):
+        """(Re)build the inverted lists, reusing persisted centroids if present"""
+        ids = np.asarray(ids, dtype=np.int64)
+        encodings = np.asarray(encodings, dtype=np.float32)
+        self.centroids = None
+        self._list_ids, self._list_vectors, self._id_to_list = [], [], {}
+
+        if len(ids) < self.min_size:
+            return
+
+        self.load()
+        if self.ready and self.trained_size * 2 < len(ids):
+            logger.info("Persisted IVF index is stale, retraining")
+            self.centroids = None
+
+        if not self.ready:
+            self.train(encodings)
+        # Siempre contra los centroides: un cliente puede haber cambiado de
+        # encoding desde el último guardado y asignar es barato frente a entrenar
+        labels = self._nearest_centroids(encodings, self.centroids)
+
+        self._populate(ids, encodings, labels)
+        self.save()
+
+    def add(self, client_id, vector):
+        if not self.ready:
+            return
+        self.remove(client_id)
+        vector = np.asarray(vector, dtype=np.float32)
+        label = int(self._nearest_centroids(vector[None, :], self.centroids)[0])
+        self._list_ids[label] = np.append(self._list_ids[label], client_id)
+        self._list_vectors[label] = np.vstack(
+            [self._list_vectors[label], vector.astype(np.float16)[None, :]]
+        )
+        self._id_to_list[client_id] = label
+
+    def remove(self, client_id):
+        label = self._id_to_list.pop(client_id, None)
+        if label is None:
+            return
+        keep = self._list_ids[label] != client_id
+        self._list_ids[label] = self._list_ids[label][keep]
+        self._list_vectors[label] = self._list_vectors[label][keep]
+
+    def search(self, probe, k=None):
+        """Return up to k candidate client ids, closest first"""
+        k = k or self.rerank_k
+        probe = np.asarray(probe, dtype=np.float32)
+        centroid_distances = np.linalg.norm(self.centroids - probe, axis=1)
+        nprobe = min(self.nprobe, len(self.centroids))
+        cells = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+
+        candidate_ids = np.concatenate([self._list_ids[c] for c in cells])
+        if not len(candidate_ids):
+            return candidate_ids
+        candidates = np.concatenate([self._list_vectors[c] for c in cells])
+        distances = np.linalg.norm(candidates.astype(np.float32) - probe, axis=1)
+
+        if len(distances) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+        else:
+            top = np.arange(len(distances))
+        return candidate_ids[top[np.argsort(distances[top])]]
+
+    def save(self):
+        """Persist the centroids; a failure only costs the next startup a retrain"""
+        if not self.path or not self.ready:
+            return
+        # Nombre por proceso: varios workers pueden reconstruir a la vez
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    trained_size=np.int64(self.trained_size),
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save IVF index to %s: %s", self.path, e)
+
+    def load(self):
+        """Load persisted centroids, if any"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                self.centroids = data["centroids"]
+                self.trained_size = int(data["trained_size"])
+        except Exception as e:
+            logger.warning("Could not load IVF index from %s: %s", self.path, e)
+            self.centroids = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            nlist=config.get("FACE_INDEX_NLIST", 0),
+            nprobe=config.get("FACE_INDEX_NPROBE", 8),
+            rerank_k=config.get("FACE_INDEX_RERANK_K", 32),
+            min_size=config.get("FACE_INDEX_MIN_SIZE", 10000),
+            path=config.get("FACE_INDEX_PATH"),
+        )
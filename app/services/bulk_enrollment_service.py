@@ -0,0 +1,353 @@
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.client import Client
+from app.services.duplicate_detection import DuplicateFaceService
+from app.services.face_gallery import face_gallery
+from app.services.face_recognition_service import FaceRecognitionService
+from app.services.face_worker_pool import _init_worker
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.csv"
+REQUIRED_COLUMNS = ("name", "email", "expiration_date", "photo")
+REPORT_FIELDS = ("row", "email", "status", "message")
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Un solo trabajo HTTP a la vez por proceso; los demás esperan en "queued"
+_job_lock = threading.Lock()
+
+
+class BulkEnrollmentService:
+    """Enroll many clients from a CSV manifest plus photos.
+
+    The source is either a ZIP holding manifest.csv and the photos, or a CSV
+    file whose photo column holds paths relative to the CSV; an optional
+    home_site column assigns each member's site. Rows are handled
+    in chunks: one set-based email lookup, parallel extraction on a process
+    pool and one executemany INSERT per chunk, each chunk committed on its
+    own. Rows whose email already exists are reported as skipped, which is
+    what makes a re-run after a failure resume where the last one stopped.
+    """
+
+    @staticmethod
+    def open_source(source):
+        """Return (rows, load_photo) for a ZIP/CSV path or an uploaded ZIP stream"""
+        if not isinstance(source, str) or zipfile.is_zipfile(source):
+            archive = zipfile.ZipFile(source)
+            with archive.open(MANIFEST_NAME) as manifest:
+                rows = list(csv.DictReader(io.TextIOWrapper(manifest, "utf-8-sig")))
+            return rows, archive.read
+
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, newline="", encoding="utf-8-sig") as manifest:
+            rows = list(csv.DictReader(manifest))
+
+        def load_photo(name):
+            with open(os.path.join(base_dir, name), "rb") as photo:
+                return photo.read()
+
+        return rows, load_photo
+
+    @staticmethod
+    def _validate(row, seen_emails):
+        missing = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+        if missing:
+            return f"Missing fields: {', '.join(missing)}"
+        try:
+            datetime.strptime(row["expiration_date"], "%Y-%m-%d")
+        except ValueError:
+            return "Invalid date format. Use YYYY-MM-DD"
+        if row["email"] in seen_emails:
+            return "Duplicate email in file"
+        return None
+
+    @staticmethod
+    def _existing_emails(emails):
+        if not emails:
+            return set()
+        return set(
+            db.session.execute(
+                select(Client.email).where(Client.email.in_(list(emails)))
+            ).scalars()
+        )
+
+    @staticmethod
+    def _insert_chunk(params):
+        """executemany INSERT; falls back to row-by-row on a unique violation"""
+        if not params:
+            return {}
+        try:
+            db.session.execute(Client.__table__.insert(), params)
+            db.session.commit()
+            return {}
+        except IntegrityError:
+            db.session.rollback()
+
+        errors = {}
+        for param in params:
+            try:
+                db.session.execute(Client.__table__.insert(), [param])
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                errors[param["email"]] = "A client with this email already exists"
+        return errors
+
+    @staticmethod
+    def _sync_gallery(emails):
+        if not face_gallery.wants_updates or not emails:
+            return
+        rows = db.session.execute(
+            select(Client.id, Client.face_encoding, Client.home_site).where(
+                Client.email.in_(emails)
+            )
+        )
+        for client_id, face_encoding, home_site in rows:
+            face_gallery.upsert(client_id, face_encoding, home_site)
+
+    @staticmethod
+    def enroll(rows, load_photo, chunk_size=None, workers=None, start_row=0):
+        """Run the job and return the per-row report (a list of dicts).
+
+        start_row skips rows already handled by an interrupted run; it is
+        optional since existing emails are skipped anyway.
+        """
+        chunk_size = chunk_size or current_app.config["BULK_ENROLL_CHUNK_SIZE"]
+        workers = workers or current_app.config["BULK_ENROLL_WORKERS"]
+        duplicate_action = DuplicateFaceService.get_action()
+        report = []
+        seen_emails = set()
+        extractor = FaceRecognitionService._extractor(
+            num_jitters=FaceRecognitionService.get_num_jitters("enroll")
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        ) as executor:
+            for chunk_start in range(start_row, len(rows), chunk_size):
+                chunk = list(
+                    enumerate(
+                        rows[chunk_start : chunk_start + chunk_size],
+                        start=chunk_start + 1,
+                    )
+                )
+
+                pending = []
+                for row_number, row in chunk:
+                    error = BulkEnrollmentService._validate(row, seen_emails)
+                    if error:
+                        report.append(
+                            {
+                                "row": row_number,
+                                "email": row.get("email"),
+                                "status": "error",
+                                "message": error,
+                            }
+                        )
+                        continue
+                    seen_emails.add(row["email"])
+                    pending.append((row_number, row))
+
+                existing = BulkEnrollmentService._existing_emails(
+                    {row["email"] for _, row in pending}
+                )
+                to_extract = []
+                for row_number, row in pending:
+                    if row["email"] in existing:
+                        report.append(
+                            {
+                                "row": row_number,
+                                "email": row["email"],
+                                "status": "skipped",
+                                "message": "A client with this email already exists",
+                            }
+                        )
+                        continue
+                    try:
+                        to_extract.append((row_number, row, load_photo(row["photo"])))
+                    except Exception as e:
+                        report.append(
+                            {
+                                "row": row_number,
+                                "email": row["email"],
+                                "status": "error",
+                                "message": f"Could not read photo: {str(e)}",
+                            }
+                        )
+
+                encodings = executor.map(
+                    extractor, [photo for _, _, photo in to_extract], chunksize=4
+                )
+
+                params, inserted, notes = [], [], {}
+                for (row_number, row, _), (face_encoding, error) in zip(
+                    to_extract, encodings
+                ):
+                    duplicate = None
+                    if not error:
+                        duplicate = DuplicateFaceService.find_duplicate(face_encoding)
+                        if duplicate and duplicate_action == "reject":
+                            error = f"Face already enrolled as client {duplicate['client_id']}"
+                    if error:
+                        report.append(
+                            {
+                                "row": row_number,
+                                "email": row["email"],
+                                "status": "error",
+                                "message": f"Face registration failed: {error}",
+                            }
+                        )
+                        continue
+                    if duplicate:
+                        notes[row["email"]] = (
+                            f"Possible duplicate of client {duplicate['client_id']}"
+                        )
+                    params.append(
+                        {
+                            "name": row["name"],
+                            "email": row["email"],
+                            "expiration_date": datetime.strptime(
+                                row["expiration_date"], "%Y-%m-%d"
+                            ).date(),
+                            "face_encoding": face_encoding,
+                            "home_site": row.get("home_site") or None,
+                        }
+                    )
+                    inserted.append(row_number)
+
+                insert_errors = BulkEnrollmentService._insert_chunk(params)
+                for row_number, param in zip(inserted, params):
+                    error = insert_errors.get(param["email"])
+                    report.append(
+                        {
+                            "row": row_number,
+                            "email": param["email"],
+                            "status": "error" if error else "created",
+                            "message": error or notes.get(param["email"], ""),
+                        }
+                    )
+
+                BulkEnrollmentService._sync_gallery(
+                    [p["email"] for p in params if p["email"] not in insert_errors]
+                )
+                logger.info(
+                    "Bulk enrollment: processed rows up to %d of %d",
+                    chunk_start + len(chunk),
+                    len(rows),
+                )
+
+        report.sort(key=lambda entry: entry["row"])
+        return report
+
+    @staticmethod
+    def _job_path(job_id, suffix=".json"):
+        return os.path.join(current_app.config["BULK_ENROLL_JOB_DIR"], job_id + suffix)
+
+    @staticmethod
+    def _write_job(job_id, state):
+        path = BulkEnrollmentService._job_path(job_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as stream:
+            json.dump({"job_id": job_id, **state}, stream)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def start_job(upload):
+        """Save an uploaded ZIP and enroll it on a background thread.
+
+        Returns the job id; the manifest is parsed before returning, so a
+        malformed file still raises KeyError or BadZipFile to the caller.
+        The job's state and report live in a JSON file under
+        BULK_ENROLL_JOB_DIR, readable from any worker with get_job().
+        """
+        job_dir = current_app.config["BULK_ENROLL_JOB_DIR"]
+        os.makedirs(job_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        archive_path = BulkEnrollmentService._job_path(job_id, ".zip")
+        upload.save(archive_path)
+
+        archive = open(archive_path, "rb")
+        try:
+            rows, load_photo = BulkEnrollmentService.open_source(archive)
+        except Exception:
+            archive.close()
+            os.remove(archive_path)
+            raise
+
+        BulkEnrollmentService._write_job(job_id, {"status": "queued"})
+        threading.Thread(
+            target=BulkEnrollmentService._run_job,
+            args=(current_app._get_current_object(), job_id, archive, rows, load_photo),
+            name=f"bulk-enroll-{job_id}",
+            daemon=True,
+        ).start()
+        return job_id
+
+    @staticmethod
+    def _run_job(app, job_id, archive, rows, load_photo):
+        with app.app_context():
+            try:
+                with _job_lock:
+                    BulkEnrollmentService._write_job(job_id, {"status": "running"})
+                    report = BulkEnrollmentService.enroll(
+                        rows, load_photo, workers=app.config["BULK_ENROLL_HTTP_WORKERS"]
+                    )
+                BulkEnrollmentService._write_job(
+                    job_id,
+                    {
+                        "status": "done",
+                        "summary": BulkEnrollmentService.summarize(report),
+                        "report": report,
+                    },
+                )
+            except Exception as e:
+                logger.exception("Bulk enrollment job %s failed", job_id)
+                BulkEnrollmentService._write_job(
+                    job_id, {"status": "failed", "message": str(e)}
+                )
+            finally:
+                archive.close()
+                os.remove(archive.name)
+                db.session.remove()
+
+    @staticmethod
+    def get_job(job_id):
+        """Return the stored state of a job, or None if it is unknown"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(BulkEnrollmentService._job_path(job_id)) as stream:
+                return json.load(stream)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def summarize(report):
+        summary = {"total": len(report), "created": 0, "skipped": 0, "error": 0}
+        for entry in report:
+            summary[entry["status"]] += 1
+        return summary
+
+    @staticmethod
+    def write_report(report, stream):
+        writer = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
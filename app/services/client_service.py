@@ -1,29 +1,91 @@
+import logging
 from datetime import date
 
+from sqlalchemy import bindparam, select, true
+from sqlalchemy.orm import undefer
+
 from app import db
 from app.models.client import Client
+from app.services.face_gallery import face_gallery
+from app.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Sentencias construidas una sola vez: SQLAlchemy reutiliza su compilación
+# en cada ejecución (y asyncpg las prepara en el servidor en modo ASGI)
+GALLERY_ENCODINGS_QUERY = select(
+    Client.id, Client.face_encoding, Client.home_site
+).where(Client.active == true(), Client.face_encoding.isnot(None))
+CLIENT_BY_EMAIL_QUERY = (
+    select(Client).where(Client.email == bindparam("email")).limit(1)
+)
+VERIFY_CLIENTS_QUERY = select(
+    *[column for column in Client.__table__.columns if column.name != "face_encoding"]
+).where(Client.id.in_(bindparam("ids", expanding=True)))
 
 
 class ClientService:
+    @staticmethod
+    def _sync_gallery(client):
+        """Mirror a committed client into the in-memory gallery.
+
+        Runs after the commit and outside its try: the row is already saved,
+        so a gallery failure is logged rather than reported as a DB error.
+        """
+        try:
+            face_gallery.sync_client(client)
+        except Exception:
+            logger.exception(
+                "Could not sync client %s into the face gallery", client.id
+            )
+
     @staticmethod
     def get_active_clients():
         """Get all active clients"""
         return Client.query.filter(
-            Client.active is True, Client.expiration_date >= date.today()
+            Client.active == true(), Client.expiration_date >= date.today()
         ).all()
 
+    @staticmethod
+    def get_gallery_encodings(batch_size=1000):
+        """Stream (id, face_encoding, home_site) for every active client with a face"""
+        return db.session.execute(
+            GALLERY_ENCODINGS_QUERY.execution_options(yield_per=batch_size)
+        )
+
     @staticmethod
     def get_client_by_id(client_id):
         """Get client by ID"""
         return Client.query.get(client_id)
 
+    @staticmethod
+    def get_clients_for_verification(client_ids):
+        """Load matched clients on a read-only connection, keyed by id.
+
+        The returned Client objects are transient (not in the session); they
+        only back to_dict() and is_membership_active() in the verify path.
+        """
+        if not client_ids:
+            return {}
+        with timed("client_query"), db.engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                connection = connection.execution_options(postgresql_readonly=True)
+            rows = (
+                connection.execute(VERIFY_CLIENTS_QUERY, {"ids": list(client_ids)})
+                .mappings()
+                .all()
+            )
+        return {row["id"]: Client(**row) for row in rows}
+
     @staticmethod
     def get_client_by_email(email):
         """Get client by email"""
-        return Client.query.filter_by(email=email).first()
+        return db.session.execute(
+            CLIENT_BY_EMAIL_QUERY, {"email": email}
+        ).scalar_one_or_none()
 
     @staticmethod
-    def create_client(name, email, expiration_date, face_encoding=None):
+    def create_client(name, email, expiration_date, face_encoding=None, home_site=None):
         """Create a new client"""
         try:
             # Verificar que el email no esté ya registrado
@@ -36,14 +98,17 @@ class ClientService:
                 email=email,
                 expiration_date=expiration_date,
                 face_encoding=face_encoding,
+                home_site=home_site,
             )
             db.session.add(client)
             db.session.commit()
-            return client, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
 
+        ClientService._sync_gallery(client)
+        return client, None
+
     @staticmethod
     def update_client_face_encoding(client_id, face_encoding):
         """updating client's face encoding"""
@@ -54,15 +119,43 @@ class ClientService:
 
             client.face_encoding = face_encoding
             db.session.commit()
-            return client, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
 
+        ClientService._sync_gallery(client)
+        return client, None
+
     @staticmethod
     def get_all_clients():
         """Get all clients"""
-        return Client.query.all()
+        return Client.query.options(undefer(Client.face_encoding)).all()
+
+    @staticmethod
+    def list_clients(
+        after_id=None, limit=100, active=None, expired=None, has_face=None
+    ):
+        """Keyset page of (client, has_face) ordered by id, without the blob"""
+        has_face_expr = Client.face_encoding.isnot(None).label("has_face")
+        query = db.session.query(Client, has_face_expr)
+
+        if after_id is not None:
+            query = query.filter(Client.id > after_id)
+        if active is not None:
+            query = query.filter(Client.active == active)
+        if expired is True:
+            query = query.filter(Client.expiration_date < date.today())
+        elif expired is False:
+            query = query.filter(Client.expiration_date >= date.today())
+        if has_face is True:
+            query = query.filter(Client.face_encoding.isnot(None))
+        elif has_face is False:
+            query = query.filter(Client.face_encoding.is_(None))
+
+        query = query.order_by(Client.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
 
     @staticmethod
     def update_client(client_id, **kwargs):
@@ -80,11 +173,13 @@ class ClientService:
 
             client.updated_at = datetime.utcnow()
             db.session.commit()
-            return client, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
 
+        ClientService._sync_gallery(client)
+        return client, None
+
     @staticmethod
     def delete_client(client_id):
         """Delete a client (soft delete by setting active=False)"""
@@ -95,7 +190,9 @@ class ClientService:
 
             client.active = False
             db.session.commit()
-            return client, None
         except Exception as e:
             db.session.rollback()
             return None, str(e)
+
+        ClientService._sync_gallery(client)
+        return client, None
@@ -0,0 +1,82 @@
+import numpy as np
+from flask import current_app
+
+from app.services.face_gallery import face_gallery
+
+
+class DuplicateFaceService:
+    """Near-duplicate faces: enrollment-time check and offline clustering"""
+
+    @staticmethod
+    def get_threshold():
+        return float(current_app.config["FACE_DUPLICATE_THRESHOLD"])
+
+    @staticmethod
+    def get_action():
+        """'reject', 'flag' or 'off'"""
+        return current_app.config["FACE_DUPLICATE_ACTION"]
+
+    @staticmethod
+    def find_duplicate(face_encoding, exclude_client_id=None):
+        """Closest enrolled client within the duplicate threshold.
+
+        Returns {"client_id", "distance"} or None. exclude_client_id skips
+        the client being (re-)enrolled so a face update does not match itself.
+        """
+        if DuplicateFaceService.get_action() == "off":
+            return None
+
+        face_gallery.ensure_loaded()
+        client_id, distance = face_gallery.nearest(face_encoding, exclude_client_id)
+        if client_id is None or distance > DuplicateFaceService.get_threshold():
+            return None
+        return {"client_id": client_id, "distance": round(distance, 4)}
+
+    @staticmethod
+    def find_clusters(ids, vectors, threshold, block_size=2048):
+        """Group ids whose faces are within threshold of each other.
+
+        Distances are computed block against block (block_size² floats at a
+        time) and linked pairs are merged with union-find, so memory stays
+        O(N) instead of the O(N²) of a full distance matrix. Returns the
+        clusters with two or more ids, largest first.
+        """
+        ids = np.asarray(ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        sq_threshold = threshold * threshold
+        parent = np.arange(len(ids))
+
+        def find(i):
+            root = i
+            while parent[root] != root:
+                root = parent[root]
+            while parent[i] != root:
+                parent[i], i = root, parent[i]
+            return root
+
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start : start + block_size]
+            block_norms = sq_norms[start : start + block_size]
+            # Sólo bloques j >= i: cada par se evalúa una vez
+            for other in range(start, len(vectors), block_size):
+                sq_distances = (
+                    block_norms[:, None]
+                    + sq_norms[other : other + block_size][None, :]
+                    - 2 * (block @ vectors[other : other + block_size].T)
+                )
+                rows, cols = np.nonzero(sq_distances <= sq_threshold)
+                for a, b in zip((rows + start).tolist(), (cols + other).tolist()):
+                    if a < b:
+                        root_a, root_b = find(a), find(b)
+                        if root_a != root_b:
+                            parent[root_b] = root_a
+
+        clusters = {}
+        for i in range(len(ids)):
+            clusters.setdefault(find(i), []).append(ids[i].item())
+        return sorted(
+            (members for members in clusters.values() if len(members) > 1),
+            key=len,
+            reverse=True,
+        )
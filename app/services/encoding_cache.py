@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.metrics import metrics
+
+
+class EncodingCache:
+    """Bounded LRU/TTL cache of extraction results keyed by image content.
+
+    Kiosk retries and re-submitted enrollment photos hash to the same key,
+    so they skip detection and encoding entirely. The key also covers the
+    extraction settings (stage, landmark model, jitters), so an enrollment
+    never reuses a cheaper verify encoding or the other way round. Values
+    are the (encoding, error) tuples returned by the extraction pipeline.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def init_app(self, app):
+        self.max_entries = app.config.get("FACE_CACHE_MAX_ENTRIES", self.max_entries)
+        self.ttl = app.config.get("FACE_CACHE_TTL", self.ttl)
+
+    @staticmethod
+    def key_for(image_bytes, *fields):
+        digest = hashlib.blake2b(digest_size=16)
+        for field in fields:
+            digest.update(str(field).encode())
+            digest.update(b"\0")
+        digest.update(image_bytes)
+        return digest.digest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+encoding_cache = EncodingCache()
+
+metrics.gauge(
+    "face_cache_entries",
+    "Entries in the extraction cache.",
+    fn=lambda: encoding_cache.stats()["entries"],
+)
+for _stat in ("hits", "misses", "evictions"):
+    metrics.gauge(
+        f"face_cache_{_stat}_total",
+        f"Extraction cache {_stat}.",
+        fn=lambda stat=_stat: getattr(encoding_cache, stat),
+        kind="counter",
+    )
@@ -0,0 +1,124 @@
+import struct
+
+import numpy as np
+
+ENCODING_DIMENSIONS = 128
+
+MAGIC = b"FE"
+VERSION = 1
+
+FORMAT_FLOAT32 = "float32"
+FORMAT_INT8 = "int8"
+FORMAT_LEGACY = "legacy"
+
+_DTYPE_CODES = {FORMAT_FLOAT32: 1, FORMAT_INT8: 2}
+# Orden de precisión: solo sirve de referencia un formato más preciso
+PRECISION = {FORMAT_INT8: 0, FORMAT_FLOAT32: 1, FORMAT_LEGACY: 2}
+_CODE_DTYPES = {code: name for name, code in _DTYPE_CODES.items()}
+
+# magic (2s), versión (B), tipo (B), dimensiones (H), reservado (H)
+_HEADER = struct.Struct("<2sBBHH")
+_SCALE = struct.Struct("<f")
+
+
+class EncodingCodec:
+    """Versioned binary layout for face encodings stored in BYTEA.
+
+    New blobs carry an 8-byte header followed by a float32 payload or an
+    int8 payload with one float32 scale. Legacy blobs are the raw 1 KB
+    float64 arrays written before this format existed; they are
+    recognised by their length, which no versioned blob can have.
+    """
+
+    @staticmethod
+    def is_legacy(blob):
+        # Solo por longitud: ~1 de cada 65k vectores float64 empieza por MAGIC
+        return len(bytes(blob)) == ENCODING_DIMENSIONS * 8
+
+    @staticmethod
+    def format_of(blob):
+        blob = bytes(blob)
+        if EncodingCodec.is_legacy(blob):
+            return FORMAT_LEGACY
+        magic, version, code, _, _ = _HEADER.unpack_from(blob)
+        if magic != MAGIC or version != VERSION or code not in _CODE_DTYPES:
+            raise ValueError("Unknown face encoding format")
+        return _CODE_DTYPES[code]
+
+    @staticmethod
+    def encode(vector, encoding_format=FORMAT_FLOAT32):
+        vector = np.asarray(vector, dtype=np.float64)
+        if encoding_format == FORMAT_LEGACY:
+            return vector.tobytes()
+
+        header = _HEADER.pack(
+            MAGIC, VERSION, _DTYPE_CODES[encoding_format], len(vector), 0
+        )
+        if encoding_format == FORMAT_FLOAT32:
+            return header + vector.astype("<f4").tobytes()
+
+        # Cuantización simétrica a 8 bits con una escala por vector
+        scale = float(np.max(np.abs(vector))) / 127 or 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return header + _SCALE.pack(scale) + quantized.tobytes()
+
+    @staticmethod
+    def decode(blob, dtype=np.float32):
+        """Decode any supported layout into a 1-D array of the given dtype"""
+        blob = bytes(blob)
+        if EncodingCodec.is_legacy(blob):
+            return np.frombuffer(blob, dtype="<f8").astype(dtype, copy=False)
+
+        encoding_format = EncodingCodec.format_of(blob)
+        _, _, _, dims, _ = _HEADER.unpack_from(blob)
+        offset = _HEADER.size
+
+        if encoding_format == FORMAT_FLOAT32:
+            vector = np.frombuffer(blob, dtype="<f4", count=dims, offset=offset)
+            return vector.astype(dtype, copy=False)
+
+        (scale,) = _SCALE.unpack_from(blob, offset)
+        quantized = np.frombuffer(
+            blob, dtype=np.int8, count=dims, offset=offset + _SCALE.size
+        )
+        return (quantized.astype(dtype) * scale).astype(dtype, copy=False)
+
+    @staticmethod
+    def accuracy_report(vectors, encoding_format, tolerance, compact=None):
+        """Compare pairwise distances before and after a format round-trip.
+
+        compact holds the stored vectors when they were already converted
+        (e.g. by a migration); otherwise the round-trip is simulated.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if compact is None:
+            compact = np.vstack(
+                [
+                    EncodingCodec.decode(EncodingCodec.encode(v, encoding_format))
+                    for v in vectors
+                ]
+            )
+        compact = np.asarray(compact, dtype=np.float64)
+
+        def pairwise(matrix):
+            sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+            sq = sq_norms[:, None] + sq_norms[None, :] - 2 * (matrix @ matrix.T)
+            return np.sqrt(np.maximum(sq, 0.0))
+
+        upper = np.triu_indices(len(vectors), k=1)
+        exact = pairwise(vectors)[upper]
+        approx = pairwise(compact)[upper]
+        error = np.abs(exact - approx)
+
+        return {
+            "format": encoding_format,
+            "bytes_per_encoding": len(
+                EncodingCodec.encode(vectors[0], encoding_format)
+            ),
+            "pairs": int(len(exact)),
+            "max_distance_error": float(error.max()),
+            "mean_distance_error": float(error.mean()),
+            "decision_flips": int(
+                np.sum((exact <= tolerance) != (approx <= tolerance))
+            ),
+        }
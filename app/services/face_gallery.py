@@ -0,0 +1,444 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+from app.services.encoding_codec import ENCODING_DIMENSIONS, EncodingCodec
+from app.services.gallery_snapshot import GallerySnapshotStore
+from app.utils.metrics import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+SITE_MATCHES = metrics.counter(
+    "face_site_matches_total",
+    "Site-scoped matches decided locally or by the full-gallery fallback.",
+    ["scope"],
+)
+
+
+class FaceGallery:
+    """In-memory index of every enrolled face encoding.
+
+    Encodings live in one contiguous matrix with a parallel array of client
+    ids, so a match is a single vectorized distance pass plus argmin instead
+    of decoding every BYTEA blob on each request.
+
+    With a snapshot store the matrix is a copy-on-write mapping of the
+    box-wide snapshot file, and writes go through its delta log so every
+    worker process converges on the same gallery.
+
+    Clients are also grouped by home site so a gate can scan its own
+    site's rows first and only fall back to the whole gallery on a miss.
+    """
+
+    def __init__(self, dtype="float32", initial_capacity=1024, index=None):
+        self._lock = threading.RLock()
+        self._dtype = np.dtype(dtype)
+        self._index = index
+        self._initial_capacity = initial_capacity
+        self._reset(initial_capacity)
+        self.loaded = False
+        self._snapshot = None
+        self._snapshot_version = None
+        self._delta_offset = 0
+        self._delta_count = 0
+        self._poll_interval = 1.0
+        self._compact_every = 1000
+        self._next_refresh = 0.0
+
+    def __len__(self):
+        return self._size
+
+    def _reset(self, capacity):
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._encodings = np.zeros((capacity, ENCODING_DIMENSIONS), dtype=self._dtype)
+        self._sq_norms = np.zeros(capacity, dtype=self._dtype)
+        self._positions = {}
+        self._size = 0
+        self._site_of = {}
+        self._site_members = {}
+        self._site_rows = {}
+
+    def _grow(self):
+        capacity = max(self._initial_capacity, len(self._ids) * 2)
+        ids = np.zeros(capacity, dtype=np.int64)
+        encodings = np.zeros((capacity, ENCODING_DIMENSIONS), dtype=self._dtype)
+        sq_norms = np.zeros(capacity, dtype=self._dtype)
+        ids[: self._size] = self._ids[: self._size]
+        encodings[: self._size] = self._encodings[: self._size]
+        sq_norms[: self._size] = self._sq_norms[: self._size]
+        self._ids, self._encodings, self._sq_norms = ids, encodings, sq_norms
+
+    def _to_vector(self, face_encoding):
+        return EncodingCodec.decode(face_encoding, self._dtype)
+
+    def configure(self, dtype, index=None):
+        """Change the matrix dtype and ANN backend; takes effect on rebuild"""
+        with self._lock:
+            self._dtype = np.dtype(dtype)
+            self._index = index
+
+    def use_snapshots(self, store, poll_interval=1.0, compact_every=1000):
+        """Share the gallery through a GallerySnapshotStore"""
+        with self._lock:
+            self._snapshot = store
+            self._poll_interval = poll_interval
+            self._compact_every = compact_every
+
+    @property
+    def wants_updates(self):
+        """Whether writes must be reported (loaded here or shared with others)"""
+        return self.loaded or self._snapshot is not None
+
+    def rebuild(self, rows):
+        """Replace the whole index from (client_id, face_encoding[, home_site]) rows"""
+        rows = [(*row, None)[:3] for row in rows if row[1]]
+        with self._lock:
+            self.loaded = False
+            self._reset(max(self._initial_capacity, len(rows)))
+            for client_id, face_encoding, site in rows:
+                self._upsert(client_id, face_encoding, site)
+            if self._index is not None:
+                self._index.build(
+                    self._ids[: self._size], self._encodings[: self._size]
+                )
+            self.loaded = True
+
+    def load_from_db(self):
+        """Full rebuild from the clients table"""
+        from app.services.client_service import ClientService
+
+        with timed("gallery_load"):
+            if self._snapshot is not None:
+                self._load_snapshot()
+            else:
+                self.rebuild(ClientService.get_gallery_encodings())
+        logger.info("Face gallery loaded with %d encodings", len(self))
+
+    def _live_arrays(self):
+        return (
+            self._ids[: self._size],
+            self._encodings[: self._size],
+            self._sq_norms[: self._size],
+            [self._site_of.get(i) for i in self._ids[: self._size].tolist()],
+        )
+
+    def _load_snapshot(self, publish=False):
+        """Map the current snapshot, publishing one from the DB if there is none"""
+        from app.services.client_service import ClientService
+
+        with self._snapshot.lock():
+            version = self._snapshot.current_version()
+            if version is None or publish:
+                self.rebuild(ClientService.get_gallery_encodings())
+                with self._lock:
+                    version = self._snapshot.publish(*self._live_arrays())
+        self._map_snapshot(version)
+
+    def publish_from_db(self):
+        """Rebuild the shared snapshot from the clients table"""
+        self._load_snapshot(publish=True)
+
+    def _map_snapshot(self, version):
+        arrays, meta = self._snapshot.open(version)
+        size = meta["size"]
+        with self._lock:
+            self.loaded = False
+            self._reset(0)
+            self._ids = arrays["ids"]
+            self._encodings = arrays["encodings"]
+            self._sq_norms = arrays["sq_norms"]
+            self._size = size
+            self._positions = dict(zip(self._ids[:size].tolist(), range(size)))
+            for client_id, code in zip(
+                self._ids[:size].tolist(), arrays["site_codes"][:size].tolist()
+            ):
+                if code >= 0:
+                    self._set_site(client_id, meta["sites"][code])
+            if self._index is not None:
+                self._index.build(self._ids[:size], self._encodings[:size])
+            self._snapshot_version = version
+            self._delta_offset = 0
+            self._delta_count = 0
+            self.loaded = True
+            self._apply_deltas()
+
+    def _apply_deltas(self):
+        records, self._delta_offset = self._snapshot.read_deltas(
+            self._snapshot_version, self._delta_offset
+        )
+        for record in records:
+            if record["op"] == "upsert":
+                self._upsert(record["id"], record["enc"], record.get("site"))
+            else:
+                self._remove(record["id"])
+        self._delta_count += len(records)
+
+    def refresh(self, force=False):
+        """Pick up a newer snapshot or new delta records, at most every poll"""
+        if self._snapshot is None or not self.loaded:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_refresh:
+            return
+        self._next_refresh = now + self._poll_interval
+        version = self._snapshot.current_version()
+        if version != self._snapshot_version:
+            self._map_snapshot(version)
+        else:
+            with self._lock:
+                self._apply_deltas()
+
+    def compact(self):
+        """Fold the delta log into a new snapshot version"""
+        with self._snapshot.lock():
+            self.refresh(force=True)
+            if self._delta_count < self._compact_every:
+                return
+            with self._lock:
+                version = self._snapshot.publish(*self._live_arrays())
+        self._map_snapshot(version)
+
+    def _publish_delta(self, op, client_id, face_encoding=None, site=None):
+        self._snapshot.append(op, client_id, face_encoding, site)
+        if self.loaded:
+            # Aplicar en el orden del log, igual que el resto de procesos
+            self.refresh(force=True)
+            if self._delta_count >= self._compact_every:
+                self.compact()
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load_from_db()
+
+    def _set_site(self, client_id, site):
+        """Move client_id to another site partition (None = no site)"""
+        previous = self._site_of.pop(client_id, None)
+        if previous is not None:
+            self._site_members[previous].discard(client_id)
+            self._site_rows.pop(previous, None)
+        if site is not None:
+            self._site_of[client_id] = site
+            self._site_members.setdefault(site, set()).add(client_id)
+            self._site_rows.pop(site, None)
+
+    def _rows_for_site(self, site):
+        """Gallery rows of one site, cached until that partition changes"""
+        rows = self._site_rows.get(site)
+        if rows is None:
+            rows = np.fromiter(
+                (self._positions[i] for i in self._site_members.get(site, ())),
+                dtype=np.int64,
+            )
+            self._site_rows[site] = rows
+        return rows
+
+    def _upsert(self, client_id, face_encoding, site=None):
+        vector = self._to_vector(face_encoding)
+        row = self._positions.get(client_id)
+        if row is None:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._positions[client_id] = row
+            self._ids[row] = client_id
+        if self._site_of.get(client_id) != site:
+            self._set_site(client_id, site)
+        self._encodings[row] = vector
+        self._sq_norms[row] = np.dot(vector, vector)
+        if self._index is not None and self.loaded:
+            self._index.add(client_id, vector)
+
+    def upsert(self, client_id, face_encoding, site=None):
+        if self._snapshot is not None:
+            return self._publish_delta("upsert", client_id, face_encoding, site)
+        with self._lock:
+            self._upsert(client_id, face_encoding, site)
+
+    def _remove(self, client_id):
+        row = self._positions.pop(client_id, None)
+        if row is None:
+            return
+        if self._index is not None:
+            self._index.remove(client_id)
+        self._set_site(client_id, None)
+        last = self._size - 1
+        if row != last:
+            # Mover la última fila al hueco para mantener la matriz contigua
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._encodings[row] = self._encodings[last]
+            self._sq_norms[row] = self._sq_norms[last]
+            self._positions[moved_id] = row
+            self._site_rows.pop(self._site_of.get(moved_id), None)
+        self._size = last
+
+    def remove(self, client_id):
+        if self._snapshot is not None:
+            return self._publish_delta("remove", client_id)
+        with self._lock:
+            self._remove(client_id)
+
+    def sync_client(self, client):
+        """Mirror one client's current state into the index"""
+        if not self.wants_updates:
+            return
+        if client.active and client.face_encoding:
+            self.upsert(client.id, client.face_encoding, client.home_site)
+        else:
+            self.remove(client.id)
+
+    def _candidate_rows(self, probe):
+        """Rows of the ANN top-k candidates, re-ranked exactly by the caller"""
+        candidate_ids = self._index.search(probe)
+        return np.fromiter(
+            (
+                self._positions[i]
+                for i in candidate_ids.tolist()
+                if i in self._positions
+            ),
+            dtype=np.int64,
+        )
+
+    def _nearest(self, rows, probes):
+        """(client_id, distance) of the closest row for each probe; lock held"""
+        encodings = self._encodings[rows]
+        if not len(encodings):
+            return [(None, np.inf)] * len(probes)
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab, con las normas precalculadas
+        sq_distances = self._sq_norms[rows][None, :] - 2 * (probes @ encodings.T)
+        best = np.argmin(sq_distances, axis=1)
+        best_sq = sq_distances[np.arange(len(probes)), best] + np.einsum(
+            "ij,ij->i", probes, probes
+        )
+        client_ids = self._ids[rows][best]
+        distances = np.sqrt(np.maximum(best_sq, 0.0))
+        return list(zip(client_ids.tolist(), distances.tolist()))
+
+    def _search_all(self, probes):
+        """Nearest over the whole gallery (IVF when ready); lock held"""
+        if self._index is not None and self._index.ready:
+            return [
+                self._nearest(self._candidate_rows(probe), probe[None, :])[0]
+                for probe in probes
+            ]
+        return self._nearest(slice(0, self._size), probes)
+
+    def match_many(
+        self, probe_encodings, tolerance=None, site=None, with_distance=False
+    ):
+        """Match N probes at once with a single (N x gallery) distance matrix.
+
+        With a site, probes are first matched against that site's partition
+        and only those with nothing inside tolerance go on to the whole
+        gallery. Returns one (client_id, confidence) per probe, (None, 0.0)
+        when the closest face is outside tolerance; with_distance appends
+        the best distance found (inf on an empty gallery).
+        """
+        from app.services.face_recognition_service import FaceRecognitionService
+
+        if tolerance is None:
+            tolerance = FaceRecognitionService.get_tolerance()
+
+        if not len(probe_encodings):
+            return []
+
+        self.refresh()
+        probes = np.vstack([self._to_vector(p) for p in probe_encodings])
+
+        with timed("gallery_match"), self._lock:
+            if self._size == 0:
+                empty = (None, 0.0, np.inf) if with_distance else (None, 0.0)
+                return [empty] * len(probes)
+            pending = list(range(len(probes)))
+            nearest = [(None, np.inf)] * len(probes)
+            if site is not None:
+                rows = self._rows_for_site(site)
+                if len(rows):
+                    nearest = self._nearest(rows, probes)
+                    pending = [
+                        i
+                        for i, (client_id, distance) in enumerate(nearest)
+                        if client_id is None or distance > tolerance
+                    ]
+                SITE_MATCHES.inc(len(probes) - len(pending), scope="local")
+                SITE_MATCHES.inc(len(pending), scope="fallback")
+            if pending:
+                for i, item in zip(pending, self._search_all(probes[pending])):
+                    nearest[i] = item
+
+        results = []
+        for client_id, distance in nearest:
+            if client_id is None or distance > tolerance:
+                result = (None, 0.0)
+            else:
+                result = (client_id, max(0, (1 - distance) * 100))
+            results.append(result + (float(distance),) if with_distance else result)
+        return results
+
+    def nearest(self, probe_encoding, exclude_id=None):
+        """(client_id, distance) of the closest face other than exclude_id.
+
+        Goes through the ANN index when it is ready, so an enrollment-time
+        duplicate check stays sub-linear. Returns (None, inf) when empty.
+        """
+        self.refresh()
+        probe = self._to_vector(probe_encoding)[None, :]
+        with self._lock:
+            if self._index is not None and self._index.ready:
+                rows = self._candidate_rows(probe[0])
+            else:
+                rows = np.arange(self._size)
+            excluded = self._positions.get(exclude_id)
+            if excluded is not None:
+                rows = rows[rows != excluded]
+            return self._nearest(rows, probe)[0]
+
+    def match(self, probe_encoding, tolerance=None, site=None, with_distance=False):
+        """Return (client_id, confidence) of the closest face, or (None, 0.0)"""
+        return self.match_many([probe_encoding], tolerance, site, with_distance)[0]
+
+    def init_app(self, app):
+        """Build the index at startup; fall back to a lazy load on failure.
+
+        When a warm-up phase is configured it loads the gallery instead, and
+        CLI commands or child processes load it lazily on first use.
+        """
+        from app.services.warm_up import WarmUp
+
+        index = None
+        if app.config.get("FACE_INDEX_BACKEND", "exact") == "ivf":
+            index = IVFIndex.from_config(app.config)
+        self.configure(app.config.get("FACE_GALLERY_DTYPE", "float32"), index)
+        if app.config.get("FACE_SNAPSHOT_DIR"):
+            self.use_snapshots(
+                GallerySnapshotStore(
+                    app.config["FACE_SNAPSHOT_DIR"],
+                    headroom=app.config.get("FACE_SNAPSHOT_HEADROOM", 1024),
+                ),
+                poll_interval=app.config.get("FACE_SNAPSHOT_POLL_INTERVAL", 1.0),
+                compact_every=app.config.get("FACE_SNAPSHOT_COMPACT_EVERY", 1000),
+            )
+        if app.config.get("FACE_WARM_UP", "off") != "off":
+            return
+        if not WarmUp._serving_process(app):
+            return
+        with app.app_context():
+            try:
+                self.load_from_db()
+            except Exception as e:
+                logger.warning("Face gallery not loaded at startup: %s", e)
+
+
+face_gallery = FaceGallery()
+
+metrics.gauge(
+    "face_gallery_size",
+    "Encodings held in the in-memory gallery.",
+    fn=face_gallery.__len__,
+)
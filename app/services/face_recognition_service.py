@@ -1,45 +1,692 @@
 import base64
-import io
+import os
+from functools import partial
 
 import face_recognition
 import numpy as np
+from flask import current_app, has_app_context
 from PIL import Image
 
+from app.services.encoding_cache import encoding_cache
+from app.services.encoding_codec import FORMAT_FLOAT32, EncodingCodec
+from app.services.face_worker_pool import (
+    WorkerPoolBusyError,
+    WorkerTimeoutError,
+    face_worker_pool,
+)
+from app.utils.frame_quality import grayscale_view, score_frame
+from app.utils.image_pipeline import prepare_image
+from app.utils.metrics import collect, metrics, timed
+
+NO_FACE_ERROR = "No face detected in image"
+MULTIPLE_FACES_ERROR = "Multiple faces detected. Use image with single person"
+NO_ENCODING_ERROR = "Could not extract face encoding"
+TOO_DARK_ERROR = "Image is too dark"
+TOO_BRIGHT_ERROR = "Image is overexposed"
+BLURRY_ERROR = "Image is too blurry. Hold still in front of the camera"
+FACE_TOO_SMALL_ERROR = "Face is too small. Move closer to the camera"
+
+# Resultados deterministas para una misma imagen: se pueden cachear
+CACHEABLE_ERRORS = {NO_FACE_ERROR, MULTIPLE_FACES_ERROR, NO_ENCODING_ERROR}
+ERROR_REASONS = {
+    NO_FACE_ERROR: "no_face",
+    MULTIPLE_FACES_ERROR: "multiple_faces",
+    NO_ENCODING_ERROR: "no_encoding",
+    TOO_DARK_ERROR: "too_dark",
+    TOO_BRIGHT_ERROR: "too_bright",
+    BLURRY_ERROR: "blurry",
+    FACE_TOO_SMALL_ERROR: "face_too_small",
+}
+# Rechazos del filtro de calidad: el kiosco puede pedir otra toma
+QUALITY_REASONS = {"too_dark", "too_bright", "blurry", "face_too_small"}
+
+metrics.histogram(
+    "face_image_megapixels",
+    "Resolution of the uploaded images.",
+    buckets=(0.1, 0.3, 0.5, 1, 2, 5, 8, 12, 24),
+)
+EXTRACTION_ERRORS = metrics.counter(
+    "face_extraction_errors_total", "Failed extractions by reason.", ["reason"]
+)
+metrics.histogram(
+    "face_quality_sharpness",
+    "Laplacian variance of verification frames.",
+    buckets=(5, 10, 20, 50, 100, 200, 500, 1000, 2000),
+)
+metrics.histogram(
+    "face_quality_brightness",
+    "Mean gray level of verification frames.",
+    buckets=(20, 40, 60, 80, 100, 120, 140, 160, 180, 200, 220, 240),
+)
+metrics.histogram(
+    "face_quality_face_pixels",
+    "Shorter side of the detected face box, in pixels.",
+    buckets=(24, 32, 48, 64, 96, 128, 192, 256, 384),
+)
+ENCODING_TIERS = metrics.counter(
+    "face_encoding_tiers_total",
+    "Two-tier verifications by the pass that decided them.",
+    ["tier"],
+)
+
+
+def _prepare(image_bytes, detection_max_side, decode_max_side):
+    with timed("image_decode"):
+        image = prepare_image(image_bytes, detection_max_side, decode_max_side)
+    width, height = image.source_size
+    metrics.observe("face_image_megapixels", width * height / 1e6)
+    return image
+
+
+def _check_quality(image_bytes, quality):
+    """Reject dark, overexposed or blurred frames before the full decode"""
+    if not quality:
+        return None
+    with timed("quality"):
+        scores = score_frame(grayscale_view(image_bytes, quality["max_side"]))
+    metrics.observe("face_quality_sharpness", scores["sharpness"])
+    metrics.observe("face_quality_brightness", scores["brightness"])
+
+    if (
+        scores["brightness"] < quality["min_brightness"]
+        or scores["dark_fraction"] > quality["max_clipped"]
+    ):
+        return TOO_DARK_ERROR
+    if (
+        scores["brightness"] > quality["max_brightness"]
+        or scores["bright_fraction"] > quality["max_clipped"]
+    ):
+        return TOO_BRIGHT_ERROR
+    if scores["sharpness"] < quality["min_sharpness"]:
+        return BLURRY_ERROR
+    return None
+
+
+def _check_face_size(box, quality):
+    """Reject faces whose pixel-space box is too small to encode reliably"""
+    if not quality:
+        return None
+    top, right, bottom, left = box
+    size = min(bottom - top, right - left)
+    metrics.observe("face_quality_face_pixels", size)
+    return FACE_TOO_SMALL_ERROR if size < quality["min_face_px"] else None
+
+
+def _extract_from_bytes(
+    image_bytes,
+    detection_max_side=800,
+    decode_max_side=1600,
+    encoding_format=FORMAT_FLOAT32,
+    num_jitters=1,
+    quality=None,
+):
+    """Detection and encoding for one decoded image; runs in a pool worker"""
+    try:
+        error = _check_quality(image_bytes, quality)
+        if error:
+            return None, error
+
+        image = _prepare(image_bytes, detection_max_side, decode_max_side)
+
+        with timed("detect"):
+            face_locations = face_recognition.face_locations(
+                image.detection, model="hog"
+            )
+
+        if not face_locations:
+            return None, NO_FACE_ERROR
+
+        if len(face_locations) > 1:
+            return None, MULTIPLE_FACES_ERROR
+
+        box = image.to_pixel_box(face_locations[0])
+        error = _check_face_size(box, quality)
+        if error:
+            return None, error
+
+        with timed("encode"):
+            face_encodings = face_recognition.face_encodings(
+                image.pixels, [box], num_jitters=num_jitters, model="large"
+            )
+
+        if face_encodings:
+            return EncodingCodec.encode(face_encodings[0], encoding_format), None
+        else:
+            return None, NO_ENCODING_ERROR
+
+    except Exception as e:
+        return None, f"Error processing image: {str(e)}"
+
+
+def _encode_face(
+    image_bytes,
+    box=None,
+    model="small",
+    num_jitters=1,
+    detection_max_side=800,
+    decode_max_side=1600,
+    encoding_format=FORMAT_FLOAT32,
+    quality=None,
+):
+    """Encode the single face of a frame with the given landmark model.
+
+    Returns ({"box", "encoding"}, error); a later pass with a more precise
+    model passes the pixel-space box back in and skips detection.
+    """
+    try:
+        if box is None:
+            error = _check_quality(image_bytes, quality)
+            if error:
+                return None, error
+
+        image = _prepare(image_bytes, detection_max_side, decode_max_side)
+
+        if box is None:
+            with timed("detect"):
+                face_locations = face_recognition.face_locations(
+                    image.detection, model="hog"
+                )
+            if not face_locations:
+                return None, NO_FACE_ERROR
+            if len(face_locations) > 1:
+                return None, MULTIPLE_FACES_ERROR
+            box = image.to_pixel_box(face_locations[0])
+            error = _check_face_size(box, quality)
+            if error:
+                return None, error
+
+        with timed("encode" if model == "large" else f"encode_{model}"):
+            face_encodings = face_recognition.face_encodings(
+                image.pixels, [box], num_jitters=num_jitters, model=model
+            )
+        if not face_encodings:
+            return None, NO_ENCODING_ERROR
+
+        return {
+            "box": box,
+            "encoding": EncodingCodec.encode(face_encodings[0], encoding_format),
+        }, None
+
+    except Exception as e:
+        return None, f"Error processing image: {str(e)}"
+
+
+def _select_subject(boxes, image_shape, selection):
+    """Index of the face the gate should act on: largest box or most centred"""
+    if selection == "center":
+        center_y, center_x = image_shape[0] / 2, image_shape[1] / 2
+        return min(
+            range(len(boxes)),
+            key=lambda i: (
+                ((boxes[i][0] + boxes[i][2]) / 2 - center_y) ** 2
+                + ((boxes[i][1] + boxes[i][3]) / 2 - center_x) ** 2
+            ),
+        )
+    return max(
+        range(len(boxes)),
+        key=lambda i: (boxes[i][2] - boxes[i][0]) * (boxes[i][1] - boxes[i][3]),
+    )
+
+
+def _extract_all_faces(
+    image_bytes,
+    detection_max_side=800,
+    decode_max_side=1600,
+    encoding_format=FORMAT_FLOAT32,
+    selection="largest",
+    quality=None,
+):
+    """Encode every detected face in one batched call; runs in a pool worker"""
+    try:
+        error = _check_quality(image_bytes, quality)
+        if error:
+            return None, error
+
+        image = _prepare(image_bytes, detection_max_side, decode_max_side)
+
+        with timed("detect"):
+            face_locations = face_recognition.face_locations(
+                image.detection, model="hog"
+            )
+
+        if not face_locations:
+            return None, NO_FACE_ERROR
+
+        boxes = [image.to_pixel_box(box) for box in face_locations]
+        subject = _select_subject(boxes, image.pixels.shape, selection)
+        error = _check_face_size(boxes[subject], quality)
+        if error:
+            return None, error
+
+        with timed("encode"):
+            face_encodings = face_recognition.face_encodings(
+                image.pixels, boxes, model="large"
+            )
+
+        if len(face_encodings) != len(boxes):
+            return None, NO_ENCODING_ERROR
+
+        faces = [
+            {"box": box, "encoding": EncodingCodec.encode(encoding, encoding_format)}
+            for box, encoding in zip(boxes, face_encodings)
+        ]
+        return {"faces": faces, "subject": subject}, None
+
+    except Exception as e:
+        return None, f"Error processing image: {str(e)}"
+
+
+def _face_thumbnail(pixels, box, size=16):
+    """Small grayscale patch of the face used to tell if it moved"""
+    top, right, bottom, left = box
+    crop = Image.fromarray(pixels[top:bottom, left:right]).convert("L")
+    return np.asarray(crop.resize((size, size), Image.BILINEAR), dtype=np.float32)
+
+
+def _box_iou(a, b):
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union else 0.0
+
+
+def _detect_in_roi(image, roi, margin=0.5):
+    """Run HOG only around the previous face box.
+
+    The ROI is cropped from the downscaled detection array, so it never
+    costs more than a full-frame detection; boxes come back in pixel space.
+    """
+    height, width = image.detection.shape[:2]
+    top, right, bottom, left = roi
+    top, bottom = top / image.scale_y, bottom / image.scale_y
+    left, right = left / image.scale_x, right / image.scale_x
+    pad_y, pad_x = (bottom - top) * margin, (right - left) * margin
+    y0, y1 = max(0, int(top - pad_y)), min(height, int(bottom + pad_y) + 1)
+    x0, x1 = max(0, int(left - pad_x)), min(width, int(right + pad_x) + 1)
+    boxes = face_recognition.face_locations(image.detection[y0:y1, x0:x1], model="hog")
+    return [
+        image.to_pixel_box(
+            (box_top + y0, box_right + x0, box_bottom + y0, box_left + x0)
+        )
+        for box_top, box_right, box_bottom, box_left in boxes
+    ]
+
+
+def _track_frame(
+    image_bytes,
+    roi=None,
+    previous_thumb=None,
+    min_iou=0.6,
+    max_thumb_diff=8.0,
+    detection_max_side=800,
+    decode_max_side=1600,
+    encoding_format=FORMAT_FLOAT32,
+    quality=None,
+):
+    """One frame of a kiosk track; runs in a pool worker.
+
+    Detection is limited to the previous box when there is one. If the face
+    is still in the same place and looks the same, encoding is skipped and
+    the result carries encoding=None so the caller can reuse its last match.
+    """
+    try:
+        error = _check_quality(image_bytes, quality)
+        if error:
+            return None, error
+
+        image = _prepare(image_bytes, detection_max_side, decode_max_side)
+
+        with timed("detect"):
+            boxes = _detect_in_roi(image, roi) if roi is not None else []
+            if not boxes:
+                boxes = [
+                    image.to_pixel_box(box)
+                    for box in face_recognition.face_locations(
+                        image.detection, model="hog"
+                    )
+                ]
+        if not boxes:
+            return None, NO_FACE_ERROR
+
+        box = boxes[_select_subject(boxes, image.pixels.shape, "largest")]
+        error = _check_face_size(box, quality)
+        if error:
+            return None, error
+        thumb = _face_thumbnail(image.pixels, box)
+
+        if (
+            roi is not None
+            and previous_thumb is not None
+            and _box_iou(box, roi) >= min_iou
+            and float(np.mean(np.abs(thumb - previous_thumb))) <= max_thumb_diff
+        ):
+            return {"box": box, "thumb": thumb, "encoding": None}, None
+
+        with timed("encode"):
+            face_encodings = face_recognition.face_encodings(
+                image.pixels, [box], model="large"
+            )
+        if not face_encodings:
+            return None, NO_ENCODING_ERROR
+
+        return {
+            "box": box,
+            "thumb": thumb,
+            "encoding": EncodingCodec.encode(face_encodings[0], encoding_format),
+        }, None
+
+    except Exception as e:
+        return None, f"Error processing image: {str(e)}"
+
 
 class FaceRecognitionService:
     @staticmethod
-    def extract_face_encoding(image_data):
-        try:
+    def get_tolerance():
+        """Read the match tolerance from the environment"""
+        return float(os.getenv("FACE_RECOGNITION_TOLERANCE", 0.45))
+
+    @staticmethod
+    def get_num_jitters(stage):
+        """Re-sampling passes per encoding for a stage: enroll, verify or fast"""
+        if not has_app_context():
+            return 1
+        return current_app.config.get(f"FACE_{stage.upper()}_NUM_JITTERS", 1)
+
+    @staticmethod
+    def quality_options(stage="verify"):
+        """Frame-quality thresholds for the workers; None skips the filter.
+
+        Only verification frames are filtered: enrollment photos are taken
+        on purpose and a rejection there would only get in the way.
+        """
+        if stage == "enroll" or not has_app_context():
+            return None
+        config = current_app.config
+        if not config["FACE_QUALITY_FILTER"]:
+            return None
+        return {
+            "max_side": config["FACE_QUALITY_MAX_SIDE"],
+            "min_sharpness": config["FACE_QUALITY_MIN_SHARPNESS"],
+            "min_brightness": config["FACE_QUALITY_MIN_BRIGHTNESS"],
+            "max_brightness": config["FACE_QUALITY_MAX_BRIGHTNESS"],
+            "max_clipped": config["FACE_QUALITY_MAX_CLIPPED"],
+            "min_face_px": config["FACE_QUALITY_MIN_FACE_PX"],
+        }
+
+    @staticmethod
+    def error_reason(error):
+        """Stable reason code for an extraction error message"""
+        return ERROR_REASONS.get(error, "exception")
+
+    @staticmethod
+    def _extractor(fn=_extract_from_bytes, **options):
+        """Worker entry point bound to the configured pre-processing sizes"""
+        if has_app_context():
+            options.setdefault(
+                "detection_max_side", current_app.config["FACE_DETECTION_MAX_SIDE"]
+            )
+            options.setdefault(
+                "decode_max_side", current_app.config["FACE_DECODE_MAX_SIDE"]
+            )
+            options.setdefault(
+                "encoding_format", current_app.config["FACE_ENCODING_FORMAT"]
+            )
+        return partial(fn, **options)
+
+    @staticmethod
+    def _run(fn, image_bytes):
+        """Run one extraction on the pool, replaying the worker's stage timings"""
+        with timed("extract"):
+            result, observations = face_worker_pool.run(
+                partial(collect, fn), image_bytes
+            )
+        metrics.replay(observations)
+        FaceRecognitionService._count_error(result[1])
+        return result
+
+    @staticmethod
+    def _count_error(error):
+        if error:
+            EXTRACTION_ERRORS.inc(reason=FaceRecognitionService.error_reason(error))
+
+    @staticmethod
+    def _decode_payload(image_data):
+        """Turn a base64 string, data URL or upload stream into decoder input"""
+        with timed("payload_decode"):
             if isinstance(image_data, str):
                 if "," in image_data:
-                    image_data = base64.b64decode(image_data.split(",")[1])
-                else:
-                    image_data = base64.b64decode(image_data)
+                    return base64.b64decode(image_data.split(",")[1])
+                return base64.b64decode(image_data)
+            if hasattr(image_data, "read") and (
+                face_worker_pool.enabled or encoding_cache.enabled
+            ):
+                # El stream no cruza a otro proceso y la caché necesita los bytes
+                return image_data.read()
+            return image_data
 
-            image = Image.open(io.BytesIO(image_data))
+    @staticmethod
+    def _cache_lookup(image_bytes, stage, model="large"):
+        """Return (cache_key, cached_result); both None when not cacheable"""
+        if not encoding_cache.enabled or not isinstance(image_bytes, bytes):
+            return None, None
+        cache_key = encoding_cache.key_for(
+            image_bytes,
+            stage,
+            model,
+            FaceRecognitionService.get_num_jitters(stage),
+        )
+        return cache_key, encoding_cache.get(cache_key)
 
-            if image.mode != "RGB":
-                image = image.convert("RGB")
+    @staticmethod
+    def _cache_store(cache_key, result):
+        if cache_key is not None and (
+            result[1] is None or result[1] in CACHEABLE_ERRORS
+        ):
+            encoding_cache.put(cache_key, result)
 
-            image_np = np.array(image)
+    @staticmethod
+    def extract_face_encoding(image_data, stage="enroll"):
+        try:
+            image_bytes = FaceRecognitionService._decode_payload(image_data)
 
-            face_locations = face_recognition.face_locations(image_np, model="hog")
+            cache_key, cached = FaceRecognitionService._cache_lookup(image_bytes, stage)
+            if cached is not None:
+                return cached
 
-            if not face_locations:
-                return None, "No face detected in image"
+            result = FaceRecognitionService._run(
+                FaceRecognitionService._extractor(
+                    num_jitters=FaceRecognitionService.get_num_jitters(stage),
+                    quality=FaceRecognitionService.quality_options(stage),
+                ),
+                image_bytes,
+            )
+            FaceRecognitionService._cache_store(cache_key, result)
+            return result
 
-            if len(face_locations) > 1:
-                return None, "Multiple faces detected. Use image with single person"
+        except WorkerPoolBusyError:
+            EXTRACTION_ERRORS.inc(reason="busy")
+            raise
+        except WorkerTimeoutError as e:
+            EXTRACTION_ERRORS.inc(reason="timeout")
+            return None, str(e)
+        except Exception as e:
+            return None, f"Error processing image: {str(e)}"
 
-            face_encodings = face_recognition.face_encodings(
-                image_np, face_locations, model="large"
-            )
+    @staticmethod
+    def extract_face_encodings(images):
+        """Extract one encoding per image; returns a list of (encoding, error)"""
+        results = [None] * len(images)
+        payloads = {}
+        cache_keys = {}
 
-            if face_encodings:
-                return face_encodings[0].tobytes(), None
+        for i, image_data in enumerate(images):
+            try:
+                image_bytes = FaceRecognitionService._decode_payload(image_data)
+            except Exception as e:
+                results[i] = (None, f"Error processing image: {str(e)}")
+                continue
+
+            cache_keys[i], cached = FaceRecognitionService._cache_lookup(
+                image_bytes, "verify"
+            )
+            if cached is not None:
+                results[i] = cached
             else:
-                return None, "Could not extract face encoding"
+                payloads[i] = image_bytes
 
+        with timed("extract"):
+            extracted = face_worker_pool.map(
+                partial(
+                    collect,
+                    FaceRecognitionService._extractor(
+                        num_jitters=FaceRecognitionService.get_num_jitters("verify"),
+                        quality=FaceRecognitionService.quality_options(),
+                    ),
+                ),
+                list(payloads.values()),
+                timeout_result=((None, "Face extraction timed out"), []),
+            )
+        for i, (result, observations) in zip(payloads.keys(), extracted):
+            metrics.replay(observations)
+            FaceRecognitionService._count_error(result[1])
+            FaceRecognitionService._cache_store(cache_keys[i], result)
+            results[i] = result
+
+        return results
+
+    @staticmethod
+    def extract_and_match(image_data, match):
+        """Encode a verification probe and match it; returns (match, error).
+
+        match(encoding) must return (client_id, confidence, distance). In
+        "two_tier" mode the probe is first encoded with the 5-point landmark
+        model and only re-encoded with the 68-point one, reusing the detected
+        box, when the best distance falls within FACE_AMBIGUOUS_BAND of the
+        tolerance; clear matches and clear misses keep the cheap encoding.
+        """
+        config = current_app.config
+        if config["FACE_VERIFY_ENCODING"] != "two_tier":
+            encoding, error = FaceRecognitionService.extract_face_encoding(
+                image_data, stage="verify"
+            )
+            return (None, error) if error else (match(encoding), None)
+
+        try:
+            image_bytes = FaceRecognitionService._decode_payload(image_data)
+            if hasattr(image_bytes, "read"):
+                # La segunda pasada vuelve a leer la imagen
+                image_bytes = image_bytes.read()
+
+            # La caché solo guarda encodings del modelo grande: misma clave
+            # que la verificación de una sola pasada
+            cache_key, cached = FaceRecognitionService._cache_lookup(
+                image_bytes, "verify"
+            )
+            if cached is not None:
+                ENCODING_TIERS.inc(tier="cached")
+                return (None, cached[1]) if cached[1] else (match(cached[0]), None)
+
+            fast, error = FaceRecognitionService._run(
+                FaceRecognitionService._extractor(
+                    _encode_face,
+                    model="small",
+                    num_jitters=FaceRecognitionService.get_num_jitters("fast"),
+                    quality=FaceRecognitionService.quality_options(),
+                ),
+                image_bytes,
+            )
+            if error:
+                FaceRecognitionService._cache_store(cache_key, (None, error))
+                return None, error
+
+            result = match(fast["encoding"])
+            tolerance = FaceRecognitionService.get_tolerance()
+            if abs(result[2] - tolerance) > config["FACE_AMBIGUOUS_BAND"]:
+                ENCODING_TIERS.inc(tier="fast")
+                return result, None
+
+            precise, error = FaceRecognitionService._run(
+                FaceRecognitionService._extractor(
+                    _encode_face,
+                    box=fast["box"],
+                    model="large",
+                    num_jitters=FaceRecognitionService.get_num_jitters("verify"),
+                ),
+                image_bytes,
+            )
+            if error:
+                # Sin segunda pasada se decide con el encoding rápido
+                ENCODING_TIERS.inc(tier="fast")
+                return result, None
+
+            ENCODING_TIERS.inc(tier="precise")
+            FaceRecognitionService._cache_store(cache_key, (precise["encoding"], None))
+            return match(precise["encoding"]), None
+
+        except WorkerPoolBusyError:
+            EXTRACTION_ERRORS.inc(reason="busy")
+            raise
+        except WorkerTimeoutError as e:
+            EXTRACTION_ERRORS.inc(reason="timeout")
+            return None, str(e)
+        except Exception as e:
+            return None, f"Error processing image: {str(e)}"
+
+    @staticmethod
+    def extract_all_face_encodings(image_data, selection="largest"):
+        """Encode every face in a frame and pick the subject.
+
+        Returns (faces, subject_index, error); each face is a dict with the
+        pixel-space box and the encoded bytes.
+        """
+        try:
+            image_bytes = FaceRecognitionService._decode_payload(image_data)
+            result, error = FaceRecognitionService._run(
+                FaceRecognitionService._extractor(
+                    _extract_all_faces,
+                    selection=selection,
+                    quality=FaceRecognitionService.quality_options(),
+                ),
+                image_bytes,
+            )
+            if error:
+                return None, None, error
+            return result["faces"], result["subject"], None
+
+        except WorkerPoolBusyError:
+            raise
+        except WorkerTimeoutError as e:
+            return None, None, str(e)
+        except Exception as e:
+            return None, None, f"Error processing image: {str(e)}"
+
+    @staticmethod
+    def track_frame(image_data, roi=None, previous_thumb=None):
+        """Process one kiosk stream frame; returns (result, error)"""
+        try:
+            image_bytes = FaceRecognitionService._decode_payload(image_data)
+            options = {}
+            if has_app_context():
+                options["min_iou"] = current_app.config["FACE_TRACK_MIN_IOU"]
+                options["max_thumb_diff"] = current_app.config["FACE_TRACK_MAX_DIFF"]
+            return FaceRecognitionService._run(
+                FaceRecognitionService._extractor(
+                    _track_frame,
+                    roi=roi,
+                    previous_thumb=previous_thumb,
+                    quality=FaceRecognitionService.quality_options(),
+                    **options,
+                ),
+                image_bytes,
+            )
+
+        except WorkerPoolBusyError:
+            raise
+        except WorkerTimeoutError as e:
+            return None, str(e)
         except Exception as e:
             return None, f"Error processing image: {str(e)}"
 
@@ -47,19 +694,17 @@ class FaceRecognitionService:
     def compare_faces(known_encoding, test_image_data, tolerance=None):
         try:
             if tolerance is None:
-                import os
-
-                tolerance = float(os.getenv("FACE_RECOGNITION_TOLERANCE", 0.45))
+                tolerance = FaceRecognitionService.get_tolerance()
 
             test_encoding_bytes, error = FaceRecognitionService.extract_face_encoding(
-                test_image_data
+                test_image_data, stage="verify"
             )
 
             if error:
                 return False, 0.0, error
 
-            known_encoding_np = np.frombuffer(known_encoding, dtype=np.float64)
-            test_encoding_np = np.frombuffer(test_encoding_bytes, dtype=np.float64)
+            known_encoding_np = EncodingCodec.decode(known_encoding, np.float64)
+            test_encoding_np = EncodingCodec.decode(test_encoding_bytes, np.float64)
 
             distance = face_recognition.face_distance(
                 [known_encoding_np], test_encoding_np
@@ -0,0 +1,183 @@
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolBusyError(Exception):
+    """Raised when every worker slot and queue slot is taken"""
+
+
+class WorkerTimeoutError(Exception):
+    """Raised when a task does not finish within the per-task timeout"""
+
+
+def _init_worker():
+    """Load the dlib models once per worker process"""
+    import face_recognition
+    import numpy as np
+
+    blank = np.zeros((150, 150, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank, model="hog")
+    face_recognition.face_encodings(blank, [(0, 150, 150, 0)], model="large")
+
+
+# Tope para que todos los workers carguen los modelos al arrancar el pool
+WORKER_START_TIMEOUT = 120
+
+
+def _init_pool_worker(started):
+    """Load the models, then wait until every worker of the pool has too"""
+    _init_worker()
+    started.wait(WORKER_START_TIMEOUT)
+
+
+def _warm_up():
+    return True
+
+
+class FaceWorkerPool:
+    """Bounded, pre-warmed process pool for CPU-bound face extraction.
+
+    At most ``workers + queue_depth`` tasks are accepted at once; beyond
+    that submit() raises WorkerPoolBusyError so the caller can answer 503
+    instead of queueing without limit. With ``workers == 0`` tasks run
+    inline in the calling thread.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.queue_depth = 0
+        self.timeout = None
+        self.start_method = "spawn"
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.in_flight = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def init_app(self, app):
+        self.workers = app.config.get("FACE_WORKERS", 0)
+        self.queue_depth = app.config.get("FACE_WORKER_QUEUE_DEPTH", self.workers * 2)
+        self.timeout = app.config.get("FACE_WORKER_TIMEOUT", 10)
+        self.start_method = app.config.get("FACE_WORKER_START_METHOD", "spawn")
+
+    def start(self):
+        """Create the pool and load the models in every worker"""
+        with self._lock:
+            if self._executor is not None or not self.enabled:
+                return
+            # Un único semáforo durante toda la vida del pool: las tareas en
+            # curso lo liberan aunque el executor se recree tras una caída
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(
+                    self.workers + self.queue_depth
+                )
+            context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_pool_worker,
+                initargs=(context.Barrier(self.workers),),
+            )
+            # Una tarea por worker: cada envío lanza un proceso y ninguna
+            # termina hasta que todos han pasado la barrera con los modelos
+            for future in [
+                self._executor.submit(_warm_up) for _ in range(self.workers)
+            ]:
+                future.result()
+            logger.info("Face worker pool started with %d workers", self.workers)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise WorkerPoolBusyError("Face recognition workers are saturated")
+        try:
+            try:
+                future = self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Un worker murió (p.ej. OOM); recrear el pool una vez
+                logger.warning("Face worker pool is broken, restarting it")
+                self.shutdown()
+                self.start()
+                future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._count_lock:
+            self.in_flight += 1
+        # El slot se libera cuando la tarea termina, no cuando el cliente deja de esperar
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._count_lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _result(self, future, deadline):
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            raise WorkerTimeoutError("Face extraction timed out")
+
+    def run(self, fn, *args):
+        """Run fn(*args) on a worker and wait at most the configured timeout"""
+        if not self.enabled:
+            return fn(*args)
+        self.start()
+        future = self._submit(fn, *args)
+        return self._result(future, time.monotonic() + self.timeout)
+
+    def map(self, fn, items, timeout_result=None):
+        """Run fn over items in parallel; all-or-nothing admission.
+
+        Items that time out yield timeout_result instead of failing the batch.
+        """
+        if not self.enabled:
+            return [fn(item) for item in items]
+        self.start()
+        futures = []
+        try:
+            for item in items:
+                futures.append(self._submit(fn, item))
+        except WorkerPoolBusyError:
+            for future in futures:
+                future.cancel()
+            raise
+        deadline = time.monotonic() + self.timeout
+        results = []
+        for future in futures:
+            try:
+                results.append(self._result(future, deadline))
+            except WorkerTimeoutError:
+                results.append(timeout_result)
+        return results
+
+
+face_worker_pool = FaceWorkerPool()
+atexit.register(face_worker_pool.shutdown)
+
+metrics.gauge(
+    "face_worker_tasks_in_flight",
+    "Extraction tasks queued or running on the worker pool.",
+    fn=lambda: face_worker_pool.in_flight,
+)
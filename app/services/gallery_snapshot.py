@@ -0,0 +1,163 @@
+import base64
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ("ids", "encodings", "sq_norms", "site_codes")
+
+
+class GallerySnapshotStore:
+    """Versioned gallery files shared by every worker process on a box.
+
+    Each version is a directory of .npy arrays (ids, encodings, squared
+    norms, home-site codes) with spare rows at the end, named by a CURRENT file that is
+    swapped atomically. Workers map a version copy-on-write, so untouched
+    pages are shared through the page cache, and replay that version's
+    append-only delta log for enrollments made since it was written.
+    """
+
+    def __init__(self, directory, headroom=1024, keep_versions=2):
+        self.directory = directory
+        self.headroom = headroom
+        self.keep_versions = keep_versions
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    @staticmethod
+    def _version_name(version):
+        return f"v{version:012d}"
+
+    def delta_path(self, version):
+        return self._path(f"{self._version_name(version)}.deltas")
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock across processes for appends, publishes and swaps"""
+        with open(self._path(".lock"), "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def current_version(self):
+        try:
+            with open(self._path("CURRENT")) as handle:
+                return int(handle.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def open(self, version):
+        """Map one version copy-on-write; returns (arrays, meta)"""
+        base = self._path(self._version_name(version))
+        with open(os.path.join(base, "meta.json")) as handle:
+            meta = json.load(handle)
+        arrays = {
+            name: np.load(os.path.join(base, f"{name}.npy"), mmap_mode="c")
+            for name in ARRAYS
+        }
+        return arrays, meta
+
+    def publish(self, ids, encodings, sq_norms, sites):
+        """Write a new version and point CURRENT at it; caller holds lock()"""
+        version = (self.current_version() or 0) + 1
+        size = len(ids)
+        capacity = size + self.headroom
+        site_names = sorted({site for site in sites if site is not None})
+        codes = {site: code for code, site in enumerate(site_names)}
+        site_codes = np.array([codes.get(site, -1) for site in sites], dtype=np.int32)
+        name = self._version_name(version)
+        tmp = self._path(f"{name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        for array_name, values, shape in (
+            ("ids", ids, (capacity,)),
+            ("encodings", encodings, (capacity, encodings.shape[1])),
+            ("sq_norms", sq_norms, (capacity,)),
+            ("site_codes", site_codes, (capacity,)),
+        ):
+            array = np.lib.format.open_memmap(
+                os.path.join(tmp, f"{array_name}.npy"),
+                mode="w+",
+                dtype=values.dtype,
+                shape=shape,
+            )
+            array[:size] = values
+            array.flush()
+            del array
+
+        with open(os.path.join(tmp, "meta.json"), "w") as handle:
+            json.dump(
+                {
+                    "version": version,
+                    "size": size,
+                    "sites": site_names,
+                    "created_at": time.time(),
+                },
+                handle,
+            )
+        os.replace(tmp, self._path(name))
+
+        # Cambio atómico de versión: los lectores ven la vieja o la nueva
+        with open(self._path("CURRENT.tmp"), "w") as handle:
+            handle.write(str(version))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(self._path("CURRENT.tmp"), self._path("CURRENT"))
+
+        self._prune(version)
+        logger.info("Published gallery snapshot %s with %d encodings", name, size)
+        return version
+
+    def _prune(self, version):
+        # Los procesos que aún mapean una versión borrada la conservan hasta soltarla
+        for old in range(1, version - self.keep_versions + 1):
+            shutil.rmtree(self._path(self._version_name(old)), ignore_errors=True)
+            try:
+                os.remove(self.delta_path(old))
+            except FileNotFoundError:
+                pass
+
+    def append(self, op, client_id, face_encoding=None, site=None):
+        """Append one upsert/remove to the current version's delta log"""
+        record = {"op": op, "id": int(client_id)}
+        if face_encoding is not None:
+            record["enc"] = base64.b64encode(bytes(face_encoding)).decode("ascii")
+        if site is not None:
+            record["site"] = site
+        line = (json.dumps(record) + "\n").encode()
+        with self.lock():
+            version = self.current_version()
+            if version is None:
+                return
+            with open(self.delta_path(version), "ab") as handle:
+                handle.write(line)
+
+    def read_deltas(self, version, offset):
+        """Complete records after offset; returns (records, new_offset)"""
+        try:
+            with open(self.delta_path(version), "rb") as handle:
+                handle.seek(offset)
+                data = handle.read()
+        except FileNotFoundError:
+            return [], offset
+        # Un registro sin salto de línea todavía se está escribiendo
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if "enc" in record:
+                record["enc"] = base64.b64decode(record["enc"])
+            records.append(record)
+        return records, offset + end
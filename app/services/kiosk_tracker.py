@@ -0,0 +1,144 @@
+import threading
+import time
+
+from app.services.face_recognition_service import _box_iou
+
+
+class Track:
+    __slots__ = (
+        "box",
+        "thumb",
+        "last_match",
+        "votes",
+        "frames",
+        "encoded_frames",
+        "decided",
+        "decision",
+        "since_encoded",
+        "updated_at",
+    )
+
+    def __init__(self):
+        self.box = None
+        self.thumb = None
+        self.last_match = None
+        self.votes = {}
+        self.frames = 0
+        self.encoded_frames = 0
+        self.decided = False
+        self.decision = None
+        self.since_encoded = 0
+        self.updated_at = time.monotonic()
+
+
+class KioskTracker:
+    """Short-lived per-kiosk face tracks for the streaming verify endpoint.
+
+    Each track remembers the last face box (used as the detection ROI for
+    the next frame), a small thumbnail to tell whether the face moved, and
+    the match votes accumulated so far. A decision is emitted once per
+    track, when one client (or "unknown") collects ``min_votes`` frames.
+
+    The face is re-encoded at least every ``reencode_every`` frames, and a
+    track is restarted when the box jumps (IoU below ``min_iou``) or a
+    fresh encoding matches someone else than the decided client, so the
+    next person at the gate does not inherit the previous decision.
+
+    Tracks live in this process's memory. With several server workers,
+    every frame of a kiosk must reach the same one (sticky routing on
+    X-Kiosk-Id at the load balancer, or a single worker for the stream
+    route); otherwise votes are split across workers and decisions come
+    late.
+    """
+
+    def __init__(
+        self, ttl=5.0, min_votes=3, max_frames=10, min_iou=0.6, reencode_every=5
+    ):
+        self.ttl = ttl
+        self.min_votes = min_votes
+        self.max_frames = max_frames
+        self.min_iou = min_iou
+        self.reencode_every = reencode_every
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("FACE_TRACK_TTL", self.ttl)
+        self.min_votes = app.config.get("FACE_TRACK_MIN_VOTES", self.min_votes)
+        self.max_frames = app.config.get("FACE_TRACK_MAX_FRAMES", self.max_frames)
+        self.min_iou = app.config.get("FACE_TRACK_MIN_IOU", self.min_iou)
+        self.reencode_every = app.config.get(
+            "FACE_TRACK_REENCODE_EVERY", self.reencode_every
+        )
+
+    def _expire(self, now):
+        expired = [
+            kiosk_id
+            for kiosk_id, track in self._tracks.items()
+            if now - track.updated_at > self.ttl
+        ]
+        for kiosk_id in expired:
+            del self._tracks[kiosk_id]
+
+    def snapshot(self, kiosk_id):
+        """Return (box, thumb, last_match) of a live track, or Nones.
+
+        thumb is None when the face is due for re-encoding, so the worker
+        cannot skip it.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            track = self._tracks.get(kiosk_id)
+            if track is None:
+                return None, None, None
+            thumb = track.thumb
+            if track.since_encoded >= self.reencode_every - 1:
+                thumb = None
+            return track.box, thumb, track.last_match
+
+    def reset(self, kiosk_id):
+        with self._lock:
+            self._tracks.pop(kiosk_id, None)
+
+    def record(self, kiosk_id, box, thumb, match, encoded):
+        """Fold one frame into the kiosk's track.
+
+        Returns (track, decision) where decision is (client_id, confidence)
+        the first time consensus is reached and None otherwise.
+        """
+        with self._lock:
+            track = self._tracks.get(kiosk_id)
+            if track is not None and (
+                _box_iou(track.box, box) < self.min_iou
+                or (track.decided and encoded and match[0] != track.decision[0])
+            ):
+                # Otra persona frente al kiosco: empieza un track nuevo
+                track = None
+            if track is None:
+                track = self._tracks[kiosk_id] = Track()
+
+            track.box, track.thumb, track.last_match = box, thumb, match
+            track.frames += 1
+            track.encoded_frames += int(encoded)
+            track.since_encoded = 0 if encoded else track.since_encoded + 1
+            track.updated_at = time.monotonic()
+
+            if track.decided:
+                return track, None
+
+            client_id, confidence = match
+            votes = track.votes.setdefault(client_id, [])
+            votes.append(confidence)
+
+            if len(votes) < self.min_votes and track.frames < self.max_frames:
+                return track, None
+
+            if len(votes) < self.min_votes:
+                # Sin consenso: se decide por el candidato con más votos
+                client_id, votes = max(track.votes.items(), key=lambda v: len(v[1]))
+            track.decided = True
+            track.decision = (client_id, sum(votes) / len(votes))
+            return track, track.decision
+
+
+kiosk_tracker = KioskTracker()
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from functools import partial
+
+from app.utils.metrics import metrics
+
+ADMISSIONS = metrics.counter(
+    "verify_admission_total",
+    "Verify requests by admission outcome.",
+    ["outcome"],
+)
+
+
+class RateLimitedError(Exception):
+    """The kiosk spent its token bucket; retry_after is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many verification requests from this kiosk")
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    """Every verification slot of this process is taken"""
+
+    def __init__(self):
+        super().__init__("Server busy, retry shortly")
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class VerifyCoordinator:
+    """Admission control and single-flight for the verify endpoint.
+
+    Each kiosk that identifies itself has a token bucket refilled at
+    ``rate`` per second up to ``burst``; an empty bucket answers 429 before
+    the body is read. Anonymous callers are not rate limited, since behind a
+    proxy or NAT they would all share one address. Requests carrying the
+    same payload while one is being computed wait for that result instead
+    of running extraction again, and the rest take one of ``max_concurrent``
+    slots or are shed with 503 before any image decoding happens.
+    """
+
+    def __init__(self, rate=0.0, burst=0, max_concurrent=0, single_flight=True):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.single_flight = single_flight
+        self.wait_timeout = 30.0
+        self._buckets = {}
+        self._flights = {}
+        self._async_flights = {}
+        self._in_flight = 0
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rate = app.config.get("VERIFY_KIOSK_RATE", self.rate)
+        self.burst = app.config.get("VERIFY_KIOSK_BURST", self.burst) or math.ceil(
+            self.rate
+        )
+        self.max_concurrent = app.config.get(
+            "VERIFY_MAX_CONCURRENT", self.max_concurrent
+        )
+        self.single_flight = app.config.get("VERIFY_SINGLE_FLIGHT", self.single_flight)
+        # Los que esperan no deberían sobrevivir al timeout de la extracción
+        self.wait_timeout = app.config.get("FACE_WORKER_TIMEOUT", 10) * 3
+
+    def _prune(self, now):
+        # Un bucket inactivo el tiempo de recargarse entero equivale a uno nuevo
+        idle = self.burst / self.rate
+        stale = [
+            key
+            for key, (_, updated_at) in self._buckets.items()
+            if now - updated_at > idle
+        ]
+        for key in stale:
+            del self._buckets[key]
+        self._next_prune = now + max(idle, 60.0)
+
+    def admit(self, kiosk_id):
+        """Take one token from the kiosk's bucket or raise RateLimitedError"""
+        if not self.rate or not kiosk_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune(now)
+            tokens, updated_at = self._buckets.get(kiosk_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets[kiosk_id] = (tokens, now)
+                ADMISSIONS.inc(outcome="rate_limited")
+                raise RateLimitedError(math.ceil((1 - tokens) / self.rate))
+            self._buckets[kiosk_id] = (tokens - 1, now)
+
+    @staticmethod
+    def key_for(image_data, *fields):
+        """Digest of the raw payload plus the fields that change the answer"""
+        digest = hashlib.blake2b(digest_size=16)
+        for field in fields:
+            digest.update(str(field).encode())
+            digest.update(b"\0")
+        if isinstance(image_data, str):
+            digest.update(image_data.encode())
+        elif isinstance(image_data, (bytes, bytearray, memoryview)):
+            digest.update(image_data)
+        else:
+            # Spool o stream del multipart: se rebobina para la extracción
+            position = image_data.tell()
+            for chunk in iter(lambda: image_data.read(64 * 1024), b""):
+                digest.update(chunk)
+            image_data.seek(position)
+        return digest.hexdigest()
+
+    def run(self, key, fn):
+        """Run fn once per concurrent key, within the concurrency cap.
+
+        Callers arriving while the same key is running get the leader's
+        result (or exception). A None key only goes through the cap.
+        """
+        coalesce = key is not None and self.single_flight
+        with self._lock:
+            flight = self._flights.get(key) if coalesce else None
+            leader = flight is None
+            if leader:
+                if self.max_concurrent and self._in_flight >= self.max_concurrent:
+                    ADMISSIONS.inc(outcome="overloaded")
+                    raise OverloadedError()
+                self._in_flight += 1
+                if coalesce:
+                    flight = self._flights[key] = _Flight()
+
+        if not leader:
+            ADMISSIONS.inc(outcome="coalesced")
+            if not flight.done.wait(self.wait_timeout):
+                raise OverloadedError()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        ADMISSIONS.inc(outcome="admitted")
+        try:
+            result = fn()
+            if flight is not None:
+                flight.result = result
+            return result
+        except BaseException as e:
+            # También KeyboardInterrupt y compañía: quien espera no debe
+            # tomar el None de result por una respuesta
+            if flight is not None:
+                flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                if flight is not None:
+                    del self._flights[key]
+            if flight is not None:
+                flight.done.set()
+
+    async def run_async(self, key, fn, offload):
+        """run() for an event loop: followers await the leader's task.
+
+        offload(fn) must run fn off the loop (e.g. on an executor) and return
+        an awaitable; it goes through run() for the concurrency cap. The
+        computation is a task of its own, so a leader whose client goes away
+        does not cancel it for the followers.
+        """
+        coalesce = key is not None and self.single_flight
+        flight = self._async_flights.get(key) if coalesce else None
+        if flight is not None:
+            ADMISSIONS.inc(outcome="coalesced")
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise OverloadedError()
+
+        flight = asyncio.ensure_future(offload(partial(self.run, None, fn)))
+        if coalesce:
+            self._async_flights[key] = flight
+            flight.add_done_callback(lambda _: self._async_flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+
+verify_coordinator = VerifyCoordinator()
+
+metrics.gauge(
+    "verify_in_flight",
+    "Verify computations running in this process.",
+    fn=lambda: verify_coordinator._in_flight,
+)
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from functools import partial
+
+from app.services.face_gallery import face_gallery
+from app.services.face_worker_pool import _init_worker, face_worker_pool
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Prime the dlib models, the gallery and the worker pool before traffic.
+
+    Modes (FACE_WARM_UP): "sync" blocks create_app until everything is
+    loaded, "background" does it in a thread while /ready answers 503,
+    "preload" is "sync" without the worker pool, which a pre-fork server
+    starts in each worker after forking, and "off" skips it.
+
+    A failed stage (typically the database not being up yet) is retried
+    with exponential backoff until it succeeds; finished stages are not
+    repeated.
+
+    Only a process that is going to serve warms up while the app is built.
+    Flask CLI commands, the debug reloader's watcher and multiprocessing
+    children (the pool's spawn workers re-import the main module) defer it
+    to their first request, so ``flask db upgrade`` never loads the models
+    or starts a pool.
+    """
+
+    def __init__(self, max_backoff=30.0):
+        self.mode = "off"
+        self.ready = False
+        self.error = None
+        self.stages = {}
+        self.max_backoff = max_backoff
+        self._app = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.mode = app.config.get("FACE_WARM_UP", "background")
+        if self.mode == "off":
+            self.ready = True
+        elif self._serving_process(app):
+            self.start(app)
+        else:
+            app.before_request(partial(self.start, app))
+
+    @staticmethod
+    def _serving_process(app):
+        if os.environ.get("FLASK_RUN_FROM_CLI") == "true":
+            return False
+        # Con el reloader de depuración el proceso padre solo vigila ficheros
+        if app.debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+            return False
+        return multiprocessing.parent_process() is None
+
+    def start(self, app):
+        """Run the configured warm-up once; later calls return at once"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if self.mode == "background":
+            threading.Thread(
+                target=self.run, args=(app,), name="face-warm-up", daemon=True
+            ).start()
+        else:
+            self.run(app, start_pool=self.mode != "preload")
+
+    def _stage(self, name, fn):
+        if name in self.stages:
+            return
+        start = time.perf_counter()
+        fn()
+        with self._lock:
+            self.stages[name] = round(time.perf_counter() - start, 3)
+
+    def run(self, app, start_pool=True, attempt=0):
+        self._app = app
+        try:
+            if not face_worker_pool.enabled:
+                # Detector, predictor y ResNet en este proceso, con una pasada de prueba
+                self._stage("models", _init_worker)
+            with app.app_context():
+                self._stage("gallery", face_gallery.ensure_loaded)
+            if start_pool and face_worker_pool.enabled:
+                self._stage("worker_pool", face_worker_pool.start)
+            self.error = None
+            self.ready = True
+            logger.info("Warm-up finished: %s", self.stages)
+        except Exception as e:
+            self.error = str(e)
+            delay = min(self.max_backoff, 2.0**attempt)
+            logger.exception("Warm-up failed, retrying in %.0fs", delay)
+            retry = threading.Timer(
+                delay, self.run, args=(app, start_pool, attempt + 1)
+            )
+            retry.daemon = True
+            retry.start()
+
+    def after_fork(self):
+        """Start this worker's extraction pool; for pre-fork servers"""
+        if face_worker_pool.enabled:
+            self.ready = False
+            self._stage("worker_pool", face_worker_pool.start)
+            self.ready = self.error is None
+        if self.error is not None and self._app is not None:
+            # El reintento del proceso maestro no sobrevive al fork
+            self.run(self._app, start_pool=False)
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "mode": self.mode,
+                "stages": dict(self.stages),
+                "error": self.error,
+            }
+
+
+warm_up = WarmUp()
@@ -0,0 +1,134 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import DB_POOL_WAIT_METRIC, metrics
+
+
+class PoolMonitor:
+    """Checkout wait times and saturation counters for the DB pool.
+
+    Waits also feed the db_pool_wait_seconds histogram on /metrics; the
+    buckets kept here back the /health/db summary.
+    """
+
+    # Límites (segundos) del histograma de espera
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            for i, bound in enumerate(self.BUCKETS):
+                if wait <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+            else:
+                self.bucket_counts[-1] += 1
+        metrics.observe(
+            DB_POOL_WAIT_METRIC, wait, outcome="timeout" if timed_out else "checkout"
+        )
+
+    def stats(self):
+        with self._lock:
+            observed = self.checkouts + self.timeouts
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / observed * 1000, 3)
+                if observed
+                else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "wait_buckets": {
+                    **{
+                        f"le_{bound}": count
+                        for bound, count in zip(self.BUCKETS, self.bucket_counts)
+                    },
+                    "le_inf": self.bucket_counts[-1],
+                },
+            }
+        if self.pool is not None:
+            stats.update(
+                {
+                    "size": self.pool.size(),
+                    "checked_out": self.pool.checkedout(),
+                    "overflow": self.pool.overflow(),
+                    "max_overflow": self.pool._max_overflow,
+                    "checked_in": self.pool.checkedin(),
+                }
+            )
+            capacity = stats["size"] + max(stats["max_overflow"], 0)
+            stats["saturation"] = (
+                round(stats["checked_out"] / capacity, 3) if capacity else 0.0
+            )
+        return stats
+
+
+pool_monitor = PoolMonitor()
+
+
+def _pool_stat(key):
+    return lambda: pool_monitor.stats().get(key)
+
+
+for _key, _documentation in (
+    ("size", "Connections kept in the DB pool."),
+    ("checked_out", "DB connections currently checked out."),
+    ("overflow", "DB overflow connections in use."),
+    ("saturation", "Checked-out share of the DB pool capacity."),
+):
+    metrics.gauge(f"db_pool_{_key}", _documentation, fn=_pool_stat(_key))
+metrics.gauge(
+    "db_pool_checkouts_total",
+    "DB pool checkouts.",
+    fn=_pool_stat("checkouts"),
+    kind="counter",
+)
+metrics.gauge(
+    "db_pool_timeouts_total",
+    "DB pool checkouts that timed out.",
+    fn=_pool_stat("timeouts"),
+    kind="counter",
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_monitor.pool = self
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_monitor.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_monitor.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool_monitor.pool = pool
+        return pool
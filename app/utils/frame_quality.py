@@ -0,0 +1,64 @@
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_pipeline import sniff_format
+
+# Niveles de gris que cuentan como negro o blanco saturado
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+
+def grayscale_view(image_source, max_side=256):
+    """Decode a small grayscale copy of an upload for quality scoring.
+
+    JPEGs are decoded straight to luma at a DCT scale close to max_side, so
+    a rejected frame never pays for the full-size colour decode. Streams are
+    rewound so prepare_image() can read them again.
+    """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        image_source = io.BytesIO(image_source)
+
+    header = image_source.read(16)
+    image_source.seek(0)
+    image_format = sniff_format(header)
+    if image_format is None:
+        raise ValueError("Only JPEG and PNG images are accepted")
+
+    try:
+        image = Image.open(image_source)
+        if image_format == "JPEG":
+            image.draft("L", (max_side, max_side))
+        image = image.convert("L")
+        factor = math.ceil(max(image.size) / max_side)
+        if factor > 1:
+            image = image.reduce(factor)
+        return np.asarray(image)
+    finally:
+        image_source.seek(0)
+
+
+def score_frame(gray):
+    """Sharpness, mean brightness and clipped shares of a uint8 gray frame.
+
+    Sharpness is the variance of the 4-neighbour Laplacian: motion blur and
+    defocus remove the high frequencies it responds to.
+    """
+    pixels = gray.astype(np.float32)
+    laplacian = (
+        pixels[:-2, 1:-1]
+        + pixels[2:, 1:-1]
+        + pixels[1:-1, :-2]
+        + pixels[1:-1, 2:]
+        - 4 * pixels[1:-1, 1:-1]
+    )
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    total = max(1, int(histogram.sum()))
+    return {
+        "sharpness": float(laplacian.var()) if laplacian.size else 0.0,
+        "brightness": float(histogram @ np.arange(256)) / total,
+        "dark_fraction": float(histogram[:DARK_LEVEL].sum()) / total,
+        "bright_fraction": float(histogram[BRIGHT_LEVEL:].sum()) / total,
+    }
@@ -1,7 +1,34 @@
 from datetime import datetime, date
 import base64
-import io
-from PIL import Image
+import tempfile
+
+from flask import Request, current_app, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.utils.image_pipeline import sniff_format
+
+BODY_TOO_LARGE_ERROR = "Request body too large"
+
+
+class UploadLimitRequest(Request):
+    """Request whose body limit depends on the endpoint being served.
+
+    Werkzeug applies max_content_length while reading, so chunked JSON and
+    multipart uploads are cut off at the same cap as sized ones.
+    """
+
+    @property
+    def max_content_length(self):
+        if current_app:
+            if self.endpoint == "auth.bulk_enroll_clients":
+                limit = current_app.config.get("BULK_UPLOAD_MAX_BYTES")
+            elif self.blueprint == "auth":
+                limit = current_app.config.get("MAX_IMAGE_UPLOAD_BYTES")
+            else:
+                limit = None
+            if limit:
+                return limit
+        return super().max_content_length
 
 
 class DateHelper:
@@ -21,14 +48,104 @@ class ImageHelper:
             if not image_data.startswith("data:image/"):
                 return False, "Invalid image format"
 
-            image_data = base64.b64decode(image_data.split(",")[1])
-
-            image = Image.open(io.BytesIO(image_data))
+            # Solo se decodifica la cabecera, no la imagen completa
+            header = base64.b64decode(image_data.split(",")[1][:24])
 
-            if image.format not in ["JPEG", "PNG", "JPG"]:
+            if sniff_format(header) is None:
                 return False, "Only JPEG and PNG images are accepted"
 
             return True, None
 
         except Exception as e:
             return False, f"Error validating image: {str(e)}"
+
+
+class RequestHelper:
+    @staticmethod
+    def _spool_body(chunk_size=64 * 1024):
+        """Copy a raw request body into a spooled file, enforcing the size limit"""
+        limit = request.max_content_length
+        spool = tempfile.SpooledTemporaryFile(
+            max_size=current_app.config.get("IMAGE_SPOOL_MAX_MEMORY", 1024 * 1024)
+        )
+        total = 0
+        try:
+            while True:
+                chunk = request.stream.read(chunk_size)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if limit and total > limit:
+                    raise RequestEntityTooLarge()
+                spool.write(chunk)
+        except RequestEntityTooLarge:
+            # Werkzeug corta también los cuerpos chunked al superar el límite
+            spool.close()
+            return None, BODY_TOO_LARGE_ERROR
+
+        if not total:
+            spool.close()
+            return None, None
+
+        spool.seek(0)
+        return spool, None
+
+    @staticmethod
+    def _read_json():
+        """Parse a JSON body, enforcing the size limit on chunked bodies"""
+        if request.content_length is not None or not request.is_json:
+            return request.get_json(silent=True), None
+
+        # Werkzeug trunca sin error un cuerpo chunked leído de una sola vez
+        body, error = RequestHelper._spool_body()
+        if error or body is None:
+            return None, error
+        with body:
+            try:
+                return current_app.json.loads(body.read()), None
+            except ValueError:
+                return None, None
+
+    @staticmethod
+    def payload_error_status(error):
+        """HTTP status for an error returned by get_image_payload"""
+        return 413 if error == BODY_TOO_LARGE_ERROR else 400
+
+    @staticmethod
+    def get_image_payload(image_field="image", many=False):
+        """Read fields and image(s) from a JSON, multipart or raw binary body.
+
+        Returns (fields, image, error). The image is a base64 string or a
+        file-like object, or a list of those when many is True. For
+        application/octet-stream bodies the fields come from the query string.
+        """
+        mimetype = request.mimetype
+
+        if mimetype == "multipart/form-data":
+            try:
+                fields = request.form.to_dict()
+                images = [f.stream for f in request.files.getlist(image_field) if f]
+            except RequestEntityTooLarge:
+                return None, None, BODY_TOO_LARGE_ERROR
+        elif mimetype == "application/octet-stream":
+            fields = request.args.to_dict()
+            body, error = RequestHelper._spool_body()
+            if error:
+                return None, None, error
+            images = [body] if body else []
+        else:
+            fields, error = RequestHelper._read_json()
+            if error:
+                return None, None, error
+            if not fields:
+                return None, None, "No data provided"
+            if not isinstance(fields, dict):
+                return None, None, "JSON body must be an object"
+            images = fields.get(image_field)
+            if many:
+                return fields, images, None
+            return fields, images or None, None
+
+        if many:
+            return fields, images, None
+        return fields, images[0] if images else None, None
@@ -0,0 +1,106 @@
+import io
+import math
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Firmas de cabecera de los formatos aceptados
+FORMAT_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+)
+
+
+def sniff_format(header):
+    """Identify the image format from its first bytes without decoding it"""
+    for signature, image_format in FORMAT_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+class PreparedImage:
+    """A decoded frame plus a downscaled copy for face detection.
+
+    ``pixels`` is the RGB array used for landmarks and encoding, ``detection``
+    is the smaller array HOG runs on. Boxes found on ``detection`` are mapped
+    back with to_pixel_box().
+    """
+
+    __slots__ = ("pixels", "detection", "scale_x", "scale_y", "format", "source_size")
+
+    def __init__(self, pixels, detection, scale_x, scale_y, image_format, source_size):
+        self.pixels = pixels
+        self.detection = detection
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.format = image_format
+        self.source_size = source_size
+
+    def to_pixel_box(self, box):
+        """Map a (top, right, bottom, left) box from detection to pixel space"""
+        top, right, bottom, left = box
+        height, width = self.pixels.shape[:2]
+        return (
+            max(0, int(round(top * self.scale_y))),
+            min(width, int(round(right * self.scale_x))),
+            min(height, int(round(bottom * self.scale_y))),
+            max(0, int(round(left * self.scale_x))),
+        )
+
+
+def _reduce_to(image, max_side):
+    factor = math.ceil(max(image.size) / max_side) if max_side else 1
+    return image.reduce(factor) if factor > 1 else image
+
+
+def prepare_image(image_source, detection_max_side=800, decode_max_side=1600):
+    """Decode an upload once and build the arrays the face pipeline needs.
+
+    JPEGs are decoded straight at reduced size with draft(), EXIF
+    orientation is applied, and both the encoding and the detection arrays
+    come from cheap integer reduce() calls, so the encoding image stays
+    within 2x of decode_max_side.
+    """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        image_source = io.BytesIO(image_source)
+
+    header = image_source.read(16)
+    image_source.seek(0)
+    image_format = sniff_format(header)
+    if image_format is None:
+        raise ValueError("Only JPEG and PNG images are accepted")
+
+    image = Image.open(image_source)
+    source_size = image.size
+
+    if image_format == "JPEG" and decode_max_side:
+        # Decodifica con escalado DCT (1/2, 1/4, 1/8) sin leer la resolución completa
+        ratio = decode_max_side / max(image.size)
+        if ratio < 1:
+            image.draft(
+                "RGB",
+                (math.ceil(image.width * ratio), math.ceil(image.height * ratio)),
+            )
+
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Solo reducciones enteras: un resize fraccional cuesta más de lo que ahorra
+    if decode_max_side and max(image.size) >= 2 * decode_max_side:
+        image = image.reduce(max(image.size) // decode_max_side)
+    small = _reduce_to(image, detection_max_side)
+
+    pixels = np.asarray(image)
+    detection = pixels if small is image else np.asarray(small)
+
+    return PreparedImage(
+        pixels=pixels,
+        detection=detection,
+        scale_x=image.width / small.width,
+        scale_y=image.height / small.height,
+        image_format=image_format,
+        source_size=source_size,
+    )
@@ -0,0 +1,286 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# Límites (segundos) por defecto para los histogramas de latencia
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_collector = threading.local()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(_Metric):
+    """Set explicitly, or computed on scrape by ``fn`` (scalar or {labels: value})"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn=None, kind=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        if kind:
+            self.kind = kind
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.fn is not None:
+            values = self.fn()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            if value is None:
+                continue
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [conteo por bucket (+Inf al final), suma, total]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            }
+        lines = self._header()
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Hot-path cost is one perf_counter pair, a bisect and a short lock per
+    observation; gauges backed by ``fn`` are only evaluated on scrape.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None, kind=None):
+        return self._register(Gauge(name, documentation, labelnames, fn, kind))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def observe(self, name, value, **labels):
+        """Observe a histogram, or buffer it when collecting in a worker"""
+        if not self.enabled:
+            return
+        buffer = getattr(_collector, "observations", None)
+        if buffer is not None:
+            buffer.append((name, value, labels))
+            return
+        self._metrics[name].observe(value, **labels)
+        if name == STAGE_METRIC and has_request_context():
+            # Tiempos por etapa de la petición actual para Server-Timing
+            timings = g.setdefault("stage_timings", {})
+            timings[labels["stage"]] = timings.get(labels["stage"], 0.0) + value
+
+    def replay(self, observations):
+        """Record observations buffered by collect() in another process"""
+        for name, value, labels in observations:
+            self.observe(name, value, **labels)
+
+    def init_app(self, app):
+        """Time every request and optionally answer with Server-Timing"""
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        server_timing = app.config.get("METRICS_SERVER_TIMING", False)
+        requests = self.histogram(
+            "http_request_duration_seconds",
+            "Request latency by endpoint and status.",
+            ["endpoint", "method", "status"],
+        )
+
+        @app.before_request
+        def start_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            start = g.pop("request_start", None)
+            if not self.enabled or start is None:
+                return response
+            elapsed = time.perf_counter() - start
+            requests.observe(
+                elapsed,
+                endpoint=request.endpoint or "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+            if server_timing:
+                stages = g.get("stage_timings", {})
+                response.headers["Server-Timing"] = ", ".join(
+                    [
+                        f"{stage};dur={value * 1000:.2f}"
+                        for stage, value in stages.items()
+                    ]
+                    + [f"total;dur={elapsed * 1000:.2f}"]
+                )
+            return response
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_METRIC = "face_stage_duration_seconds"
+metrics.histogram(
+    STAGE_METRIC, "Time spent in each verification pipeline stage.", ["stage"]
+)
+
+DB_POOL_WAIT_METRIC = "db_pool_wait_seconds"
+metrics.histogram(
+    DB_POOL_WAIT_METRIC,
+    "Time spent waiting for a DB pool connection, by outcome.",
+    ["outcome"],
+)
+
+
+@contextmanager
+def timed(stage):
+    """Time a pipeline stage into face_stage_duration_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(STAGE_METRIC, time.perf_counter() - start, stage=stage)
+
+
+def collect(fn, *args):
+    """Run fn buffering its observations; returns (result, observations).
+
+    Pool workers have their own registry, so the stage timings measured
+    there travel back with the result and are replayed in the web process.
+    """
+    _collector.observations = []
+    try:
+        return fn(*args), _collector.observations
+    finally:
+        _collector.observations = None
@@ -0,0 +1,7 @@
+from app import create_app
+from app.asgi import create_asgi_app
+import os
+
+# uvicorn asgi:application --workers 1 --loop uvloop
+flask_app = create_app(os.getenv("FLASK_ENV", "default"))
+application = create_asgi_app(flask_app)
@@ -0,0 +1,112 @@
+"""Compare the IVF index against the exact gallery scan.
+
+Reports recall@1 (does the approximate search return the same nearest
+client as the exact scan) and p50/p99 latency per query on a synthetic
+gallery of 128-d encodings.
+
+    python benchmarks/ann_benchmark.py --size 100000 --nprobe 4 8 16
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.ann_index import IVFIndex  # noqa: E402
+
+
+def synthetic_gallery(size, seed=0):
+    """Clustered vectors with roughly the spread of dlib face encodings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, size=(max(1, size // 50), 128))
+    labels = rng.integers(0, len(centers), size)
+    encodings = centers[labels] + rng.normal(0, 0.05, size=(size, 128))
+    return np.arange(1, size + 1, dtype=np.int64), encodings.astype(np.float32)
+
+
+def exact_search(encodings, probe):
+    return int(np.argmin(np.linalg.norm(encodings - probe, axis=1)))
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run(size, queries, nprobes, rerank_k, seed):
+    ids, encodings = synthetic_gallery(size, seed)
+    rng = np.random.default_rng(seed + 1)
+    targets = rng.choice(size, queries, replace=False)
+    probes = encodings[targets] + rng.normal(0, 0.02, size=(queries, 128)).astype(
+        np.float32
+    )
+
+    exact_times, exact_answers = [], []
+    for probe in probes:
+        start = time.perf_counter()
+        exact_answers.append(ids[exact_search(encodings, probe)])
+        exact_times.append(time.perf_counter() - start)
+
+    report = {
+        "size": size,
+        "queries": queries,
+        "exact": {
+            "p50_ms": percentile_ms(exact_times, 50),
+            "p99_ms": percentile_ms(exact_times, 99),
+        },
+        "ivf": [],
+    }
+
+    index = IVFIndex(rerank_k=rerank_k, min_size=0, seed=seed)
+    start = time.perf_counter()
+    index.build(ids, encodings)
+    report["ivf_build_s"] = round(time.perf_counter() - start, 2)
+    rows = {client_id: row for row, client_id in enumerate(ids.tolist())}
+
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        times, hits = [], 0
+        for probe, expected in zip(probes, exact_answers):
+            start = time.perf_counter()
+            candidates = index.search(probe)
+            candidate_rows = np.array([rows[i] for i in candidates.tolist()])
+            # Re-rank exacto de los top-k, igual que FaceGallery.match
+            best = candidates[
+                int(
+                    np.argmin(np.linalg.norm(encodings[candidate_rows] - probe, axis=1))
+                )
+            ]
+            times.append(time.perf_counter() - start)
+            hits += int(best == expected)
+        report["ivf"].append(
+            {
+                "nprobe": nprobe,
+                "nlist": len(index.centroids),
+                "recall_at_1": round(hits / queries, 4),
+                "p50_ms": percentile_ms(times, 50),
+                "p99_ms": percentile_ms(times, 99),
+            }
+        )
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--rerank-k", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = run(args.size, args.queries, args.nprobe, args.rerank_k, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Size and accuracy of the compact encoding formats.
+
+Round-trips a synthetic set of encodings through each storage format and
+reports bytes per encoding, the pairwise distance error against float64
+and how many match decisions flip at the given tolerance.
+
+    python benchmarks/encoding_format_benchmark.py --size 2000 --tolerance 0.45
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.encoding_codec import EncodingCodec  # noqa: E402
+from benchmarks.ann_benchmark import synthetic_gallery  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--tolerance", type=float, default=0.45)
+    args = parser.parse_args()
+
+    _, encodings = synthetic_gallery(args.size)
+    # Ruido en float64 para que el redondeo a float32 sea medible
+    rng = np.random.default_rng(1)
+    encodings = encodings.astype(np.float64) + rng.normal(0, 1e-4, encodings.shape)
+    report = [
+        EncodingCodec.accuracy_report(encodings, encoding_format, args.tolerance)
+        for encoding_format in ("legacy", "float32", "int8")
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
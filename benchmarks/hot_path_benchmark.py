@@ -0,0 +1,375 @@
+"""End-to-end benchmark of the enrollment and verification hot paths.
+
+Builds a synthetic gallery of N clients in a throwaway SQLite database (or
+the database given with --database-url, whose clients table is created and
+dropped), then times extract_face_encoding, compare_faces, gallery
+matching, the full /api/verify-access request through the Flask test
+client and client listing. Results are written as JSON with throughput and
+p50/p95/p99 per case so two runs can be compared.
+
+Synthetic fixture images contain no face, so extraction stops after
+detection; pass --fixtures with real photos to time the whole pipeline.
+The same photos compare the "large" and "two_tier" verification encodings
+by CPU time per request and match rate; name them <person>__<n>.jpg so the
+first photo of each person is enrolled and the others verify against it.
+
+    python benchmarks/hot_path_benchmark.py --size 1000 10000 --output new.json
+    python benchmarks/hot_path_benchmark.py --compare base.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.ann_benchmark import synthetic_gallery  # noqa: E402
+from benchmarks.image_pipeline_benchmark import SIZES, synthetic_jpeg  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(samples):
+    samples = np.asarray(samples)
+    summary = {
+        "count": int(len(samples)),
+        "throughput_per_s": round(len(samples) / float(samples.sum()), 2),
+        "mean_ms": round(float(samples.mean()) * 1000, 3),
+    }
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = round(float(np.percentile(samples, q)) * 1000, 3)
+    return summary
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def load_fixtures(directory):
+    """{name: bytes} from a folder of photos, or synthetic JPEGs by resolution"""
+    if not directory:
+        return {name: synthetic_jpeg(size) for name, size in SIZES.items()}
+    fixtures = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            with open(os.path.join(directory, filename), "rb") as image:
+                fixtures[os.path.splitext(filename)[0]] = image.read()
+    return fixtures
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_app(database_url, workers):
+    from app import create_app
+    from app.config import Config, config
+
+    config["benchmark"] = type(
+        "BenchmarkConfig",
+        (Config,),
+        {
+            "SQLALCHEMY_DATABASE_URI": database_url,
+            # Sin caché: cada repetición hace la extracción completa
+            "FACE_CACHE_MAX_ENTRIES": 0,
+            "FACE_WORKERS": workers,
+            "FACE_DUPLICATE_ACTION": "off",
+            # Todas las peticiones salen de la misma dirección
+            "VERIFY_KIOSK_RATE": 0,
+            "VERIFY_MAX_CONCURRENT": 0,
+            # La galería se carga (y se mide) después de poblar la base
+            "FACE_WARM_UP": "off",
+        },
+    )
+    return create_app("benchmark")
+
+
+def populate(size, encoding_format, seed, chunk_size=5000):
+    """Insert size synthetic clients; one in five has an expired membership"""
+    from app import db
+    from app.models.client import Client
+    from app.services.encoding_codec import EncodingCodec
+
+    _, encodings = synthetic_gallery(size, seed)
+    today = date.today()
+    for start in range(0, size, chunk_size):
+        db.session.execute(
+            Client.__table__.insert(),
+            [
+                {
+                    "name": f"Bench {i}",
+                    "email": f"bench{i}@example.com",
+                    "expiration_date": today
+                    + timedelta(days=-30 if i % 5 == 0 else 365),
+                    "face_encoding": EncodingCodec.encode(
+                        encodings[i], encoding_format
+                    ),
+                }
+                for i in range(start, min(size, start + chunk_size))
+            ],
+        )
+        db.session.commit()
+    return encodings
+
+
+def compare_encoding_modes(app, fixtures, repeat, first_id):
+    """CPU time per verification and match rate for each verify encoding.
+
+    CPU is process_time of the request thread, so it only covers the whole
+    extraction when it runs inline (--workers 0).
+    """
+    from app.services.face_gallery import face_gallery
+    from app.services.face_recognition_service import FaceRecognitionService
+
+    people = {}
+    for name, image_bytes in fixtures.items():
+        people.setdefault(name.split("__")[0], []).append(image_bytes)
+
+    probes = []
+    for client_id, photos in enumerate(people.values(), start=first_id):
+        encoding, error = FaceRecognitionService.extract_face_encoding(photos[0])
+        if error:
+            continue
+        face_gallery.upsert(client_id, encoding)
+        probes.extend((client_id, photo) for photo in photos[1:] or photos)
+    if not probes:
+        return {"skipped": "no fixture has a detectable face"}
+
+    report, decisions = {}, {}
+    original = app.config["FACE_VERIFY_ENCODING"]
+    for mode in ("large", "two_tier"):
+        app.config["FACE_VERIFY_ENCODING"] = mode
+        samples, matched, passes = [], [], []
+        for expected_id, photo in probes:
+            for _ in range(repeat):
+                calls = []
+
+                def match(encoding):
+                    calls.append(encoding)
+                    return face_gallery.match(encoding, with_distance=True)
+
+                start = time.process_time()
+                result, error = FaceRecognitionService.extract_and_match(photo, match)
+                samples.append(time.process_time() - start)
+                matched.append(not error and result[0] == expected_id)
+                passes.append(len(calls))
+        decisions[mode] = matched
+        report[mode] = {
+            "cpu_ms_per_request": round(float(np.mean(samples)) * 1000, 3),
+            "match_rate": round(float(np.mean(matched)), 4),
+        }
+        if mode == "two_tier":
+            # Una segunda llamada a match = hubo pasada con el modelo grande
+            report[mode]["precise_rate"] = round(
+                float(np.mean([n > 1 for n in passes])), 4
+            )
+    app.config["FACE_VERIFY_ENCODING"] = original
+
+    for client_id in range(first_id, first_id + len(people)):
+        face_gallery.remove(client_id)
+
+    large, two_tier = report["large"], report["two_tier"]
+    report["probes"] = len(probes)
+    report["cpu_saving_pct"] = round(
+        (1 - two_tier["cpu_ms_per_request"] / large["cpu_ms_per_request"]) * 100, 1
+    )
+    report["match_rate_change"] = round(two_tier["match_rate"] - large["match_rate"], 4)
+    report["agreement"] = round(
+        float(np.mean(np.equal(decisions["large"], decisions["two_tier"]))), 4
+    )
+    return report
+
+
+def run_size(size, fixtures, args):
+    from app import db
+    from app.services.encoding_codec import EncodingCodec
+    from app.services.face_gallery import face_gallery
+    from app.services.face_recognition_service import FaceRecognitionService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/benchmark.db"
+        app = make_app(database_url, args.workers)
+        results = {}
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            start = time.perf_counter()
+            encodings = populate(size, app.config["FACE_ENCODING_FORMAT"], args.seed)
+            elapsed = time.perf_counter() - start
+            results["populate"] = {
+                "seconds": round(elapsed, 3),
+                "rows_per_s": round(size / elapsed, 1),
+            }
+
+            results["gallery_load"] = measure(
+                face_gallery.load_from_db, max(1, args.repeat // 10), warmup=0
+            )
+
+            rng = np.random.default_rng(args.seed + 1)
+            probes = [
+                EncodingCodec.encode(
+                    encodings[i] + rng.normal(0, 0.02, 128).astype(np.float32)
+                )
+                for i in rng.integers(0, size, args.repeat)
+            ]
+            probe_iter = iter(probes * 2)
+            results["gallery_match"] = measure(
+                lambda: face_gallery.match(next(probe_iter)), args.repeat
+            )
+
+            known_encoding = EncodingCodec.encode(encodings[0])
+            for name, image_bytes in fixtures.items():
+                results[f"extract_face_encoding[{name}]"] = measure(
+                    lambda: FaceRecognitionService.extract_face_encoding(image_bytes),
+                    args.repeat,
+                )
+                results[f"compare_faces[{name}]"] = measure(
+                    lambda: FaceRecognitionService.compare_faces(
+                        known_encoding, image_bytes
+                    ),
+                    args.repeat,
+                )
+
+            results["encoding_modes"] = compare_encoding_modes(
+                app, fixtures, max(1, args.repeat // 10), first_id=size + 1
+            )
+
+        client = app.test_client()
+        for name, image_bytes in fixtures.items():
+            results[f"verify_access[{name}]"] = measure(
+                lambda: client.post(
+                    "/api/verify-access",
+                    data=image_bytes,
+                    content_type="application/octet-stream",
+                ),
+                args.repeat,
+            )
+
+        cursors = iter(
+            np.random.default_rng(args.seed + 2)
+            .integers(0, max(1, size - 100), args.repeat * 2)
+            .tolist()
+        )
+        results["list_clients[page_100]"] = measure(
+            lambda: client.get(f"/api/clients?limit=100&cursor={next(cursors)}"),
+            args.repeat,
+        )
+        results["list_clients[ndjson_export]"] = measure(
+            lambda: client.get("/api/clients?format=ndjson").get_data(),
+            max(1, args.repeat // 10),
+            warmup=0,
+        )
+
+        with app.app_context():
+            db.drop_all()
+            db.session.remove()
+            db.engine.dispose()
+
+    return results
+
+
+def compare(base, current, threshold):
+    """Print p50/p95/p99 changes; returns the cases slower than threshold"""
+    regressions = []
+    for size, cases in current["sizes"].items():
+        for case, summary in cases.items():
+            previous = base["sizes"].get(size, {}).get(case)
+            if not previous:
+                continue
+            for q in PERCENTILES:
+                key = f"p{q}_ms"
+                if key not in summary or not previous.get(key):
+                    continue
+                change = summary[key] / previous[key] - 1
+                flag = ""
+                if change > threshold:
+                    flag = "  REGRESSION"
+                    regressions.append((size, case, key, change))
+                print(
+                    f"{size:>8} {case:<40} {key:<7} {previous[key]:>10.3f} "
+                    f"{summary[key]:>10.3f} {change:+8.1%}{flag}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", help="Folder with real face photos.")
+    parser.add_argument(
+        "--database-url", help="Throwaway database; its clients table is dropped."
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="REPORT",
+        help="Baseline report, and optionally the report to compare against it.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1]) as stream:
+            report = json.load(stream)
+    else:
+        fixtures = load_fixtures(args.fixtures)
+        report = {
+            "meta": {
+                "revision": git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "repeat": args.repeat,
+                "workers": args.workers,
+                "fixtures": {name: len(data) for name, data in fixtures.items()},
+            },
+            "sizes": {str(size): run_size(size, fixtures, args) for size in args.size},
+        }
+        if args.output:
+            with open(args.output, "w") as stream:
+                json.dump(report, stream, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare[0]) as stream:
+            base = json.load(stream)
+        regressions = compare(base, report, args.threshold)
+        print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
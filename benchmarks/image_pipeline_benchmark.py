@@ -0,0 +1,101 @@
+"""Latency of the image pre-processing stage by input size.
+
+Compares the previous path (full PIL decode, np.array copy, HOG on the
+full frame) with prepare_image() (draft decode, EXIF transpose, HOG on a
+downscaled copy). Detection is timed only when face_recognition is
+installed; otherwise the report covers decoding alone.
+
+    python benchmarks/image_pipeline_benchmark.py --repeat 20
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.image_pipeline import prepare_image  # noqa: E402
+
+try:
+    import face_recognition
+except ImportError:
+    face_recognition = None
+
+SIZES = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "full_hd": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+
+def synthetic_jpeg(size, seed=0):
+    """Smooth noise so the JPEG has a realistic compressed size"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize(size, Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_path(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image_np = np.array(image)
+    if face_recognition is not None:
+        face_recognition.face_locations(image_np, model="hog")
+
+
+def pipeline_path(image_bytes, detection_max_side, decode_max_side):
+    image = prepare_image(image_bytes, detection_max_side, decode_max_side)
+    if face_recognition is not None:
+        face_recognition.face_locations(image.detection, model="hog")
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--detection-max-side", type=int, default=800)
+    parser.add_argument("--decode-max-side", type=int, default=1600)
+    args = parser.parse_args()
+
+    report = {"detection": face_recognition is not None, "sizes": {}}
+    for name, size in SIZES.items():
+        image_bytes = synthetic_jpeg(size)
+        report["sizes"][name] = {
+            "pixels": size[0] * size[1],
+            "bytes": len(image_bytes),
+            "legacy": measure(lambda: legacy_path(image_bytes), args.repeat),
+            "pipeline": measure(
+                lambda: pipeline_path(
+                    image_bytes, args.detection_max_side, args.decode_max_side
+                ),
+                args.repeat,
+            ),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+
+# gunicorn -c gunicorn.conf.py
+# El maestro carga modelos y galería antes del fork: los workers comparten
+# esas páginas en copy-on-write y arrancan ya calientes
+os.environ.setdefault("FACE_WARM_UP", "preload")
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY") or 2)
+timeout = int(os.environ.get("GUNICORN_TIMEOUT") or 30)
+preload_app = True
+
+
+def post_fork(server, worker):
+    from app import db
+    from app.services.warm_up import warm_up
+
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        # Las conexiones abiertas por el maestro no se comparten entre procesos
+        db.engine.dispose(close=False)
+    warm_up.after_fork()
@@ -0,0 +1,41 @@
+"""create clients table
+
+Revision ID: 3f0c9a1d2b7e
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3f0c9a1d2b7e"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bases creadas antes de las migraciones con db.create_all(): la tabla ya
+    # existe y basta con marcar esta revisión como aplicada
+    if sa.inspect(op.get_bind()).has_table("clients"):
+        return
+
+    op.create_table(
+        "clients",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("email", sa.String(length=120), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.Column("expiration_date", sa.Date(), nullable=False),
+        sa.Column("face_encoding", postgresql.BYTEA(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("email"),
+    )
+
+
+def downgrade():
+    op.drop_table("clients")
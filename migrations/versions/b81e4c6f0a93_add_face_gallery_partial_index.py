@@ -0,0 +1,34 @@
+"""add partial index for the face gallery query
+
+Revision ID: b81e4c6f0a93
+Revises: 3f0c9a1d2b7e
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b81e4c6f0a93"
+down_revision = "3f0c9a1d2b7e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bases creadas con db.create_all() ya tienen el índice del modelo
+    inspector = sa.inspect(op.get_bind())
+    if "ix_clients_gallery" in {ix["name"] for ix in inspector.get_indexes("clients")}:
+        return
+
+    op.create_index(
+        "ix_clients_gallery",
+        "clients",
+        ["active", "expiration_date"],
+        unique=False,
+        postgresql_where=sa.text("face_encoding IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_clients_gallery", table_name="clients")
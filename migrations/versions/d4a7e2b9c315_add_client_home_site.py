@@ -0,0 +1,33 @@
+"""add home_site to clients
+
+Revision ID: d4a7e2b9c315
+Revises: b81e4c6f0a93
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d4a7e2b9c315"
+down_revision = "b81e4c6f0a93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bases creadas con db.create_all() ya tienen la columna y su índice
+    inspector = sa.inspect(op.get_bind())
+    if "home_site" not in {c["name"] for c in inspector.get_columns("clients")}:
+        op.add_column(
+            "clients", sa.Column("home_site", sa.String(length=50), nullable=True)
+        )
+    if "ix_clients_home_site" not in {ix["name"] for ix in inspector.get_indexes("clients")}:
+        op.create_index(
+            op.f("ix_clients_home_site"), "clients", ["home_site"], unique=False
+        )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_clients_home_site"), table_name="clients")
+    op.drop_column("clients", "home_site")
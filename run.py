@@ -1,9 +1,12 @@
-from app import create_app, db
+from app import create_app
+from flask_migrate import upgrade
 import os
 
-app = create_app(os.getenv("FLASK_ENV", "default"))
-
 if __name__ == "__main__":
+    # La app solo se crea aquí: los workers "spawn" del pool reimportan este
+    # módulo como __mp_main__ y no deben levantar otra app ni otro pool
+    app = create_app(os.getenv("FLASK_ENV", "default"))
     with app.app_context():
-        db.create_all()
+        # El esquema sale de las migraciones, igual que con "flask db upgrade"
+        upgrade()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+# SQLite en memoria y sin precarga: la suite no necesita PostgreSQL
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["FACE_WARM_UP"] = "off"
+
+
+@pytest.fixture
+def app():
+    from app import create_app, db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+
+
+def _gallery(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (30, 128))
+    encodings = centers[rng.integers(0, len(centers), n)] + rng.normal(
+        0, 0.05, (n, 128)
+    )
+    return np.arange(1, n + 1), encodings.astype(np.float32)
+
+
+def _index(path):
+    return IVFIndex(nlist=30, nprobe=1, min_size=100, path=str(path))
+
+
+def test_search_finds_members_after_reload(tmp_path):
+    ids, encodings = _gallery()
+    _index(tmp_path / "ivf.npz").build(ids, encodings)
+
+    reloaded = _index(tmp_path / "ivf.npz")
+    reloaded.build(ids, encodings)
+
+    assert 42 in reloaded.search(encodings[41]).tolist()
+
+
+def test_reregistered_face_is_found_after_restart(tmp_path):
+    ids, encodings = _gallery()
+    index = _index(tmp_path / "ivf.npz")
+    index.build(ids, encodings)
+
+    # El cliente 11 vuelve a registrarse con una cara de otra celda
+    new_encoding = encodings[1999] + 0.01
+    index.add(11, new_encoding)
+    assert 11 in index.search(new_encoding).tolist()
+
+    encodings[10] = new_encoding
+    restarted = _index(tmp_path / "ivf.npz")
+    restarted.build(ids, encodings)
+
+    assert 11 in restarted.search(new_encoding).tolist()
@@ -0,0 +1,65 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.models.client import Client
+from app.services.client_service import ClientService
+
+
+@pytest.fixture
+def clients(app):
+    today = date.today()
+    rows = [
+        Client(
+            name=f"Client {n}",
+            email=f"client{n}@example.com",
+            active=n != 3,
+            expiration_date=today + timedelta(days=-1 if n == 4 else 30),
+            face_encoding=b"\x00" * 8 if n % 2 else None,
+        )
+        for n in range(1, 8)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def test_keyset_pages_cover_every_client_once(clients):
+    seen, cursor = [], None
+    while True:
+        page = ClientService.list_clients(after_id=cursor, limit=3).all()
+        seen += [client.id for client, _ in page]
+        if len(page) < 3:
+            break
+        cursor = page[-1][0].id
+
+    assert seen == clients
+
+
+def test_filters_and_face_flag(clients):
+    rows = ClientService.list_clients(active=True, expired=False).all()
+
+    assert [client.id for client, _ in rows] == [clients[n] for n in (0, 1, 4, 5, 6)]
+    assert [has_face for _, has_face in rows] == [True, False, True, False, True]
+    assert ClientService.list_clients(has_face=False).count() == 3
+
+
+def test_endpoint_returns_a_cursor_until_the_last_page(client, clients):
+    first = client.get("/api/clients?limit=4").get_json()
+    second = client.get(f"/api/clients?limit=4&cursor={first['next_cursor']}")
+
+    assert [c["id"] for c in first["clients"]] == clients[:4]
+    assert [c["id"] for c in second.get_json()["clients"]] == clients[4:]
+    assert second.get_json()["next_cursor"] is None
+    assert client.get("/api/clients?active=maybe").status_code == 400
+
+
+def test_ndjson_export_streams_every_client(client, clients):
+    response = client.get("/api/clients?format=ndjson&has_face=true")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == "application/x-ndjson"
+    assert [line["id"] for line in lines] == clients[::2]
+    assert all(line["has_face"] for line in lines)
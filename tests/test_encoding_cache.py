@@ -0,0 +1,19 @@
+from app.services.encoding_cache import EncodingCache
+
+
+def test_key_depends_on_extraction_settings():
+    image = b"\xff\xd8same image bytes"
+    verify = EncodingCache.key_for(image, "verify", "large", 1)
+
+    assert verify == EncodingCache.key_for(image, "verify", "large", 1)
+    assert verify != EncodingCache.key_for(image, "enroll", "large", 1)
+    assert verify != EncodingCache.key_for(image, "verify", "small", 1)
+    assert verify != EncodingCache.key_for(image, "verify", "large", 5)
+
+
+def test_stage_keys_do_not_share_entries():
+    cache = EncodingCache(max_entries=8)
+    image = b"\xff\xd8same image bytes"
+    cache.put(EncodingCache.key_for(image, "verify", "large", 1), (b"fast", None))
+
+    assert cache.get(EncodingCache.key_for(image, "enroll", "large", 10)) is None
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.services.encoding_codec import (
+    FORMAT_FLOAT32,
+    FORMAT_INT8,
+    FORMAT_LEGACY,
+    MAGIC,
+    EncodingCodec,
+)
+
+
+def _vector(seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, 128)
+
+
+@pytest.mark.parametrize("encoding_format", [FORMAT_FLOAT32, FORMAT_INT8])
+def test_versioned_round_trip(encoding_format):
+    vector = _vector()
+    blob = EncodingCodec.encode(vector, encoding_format)
+
+    assert EncodingCodec.format_of(blob) == encoding_format
+    assert not EncodingCodec.is_legacy(blob)
+    np.testing.assert_allclose(EncodingCodec.decode(blob), vector, atol=2e-3)
+
+
+def test_legacy_round_trip():
+    vector = _vector(1)
+    blob = EncodingCodec.encode(vector, FORMAT_LEGACY)
+
+    assert EncodingCodec.format_of(blob) == FORMAT_LEGACY
+    np.testing.assert_array_equal(EncodingCodec.decode(blob, np.float64), vector)
+
+
+def test_legacy_blob_starting_with_magic():
+    # Un float64 cuyos dos primeros bytes coinciden con la cabecera versionada
+    vector = _vector(2)
+    raw = bytearray(vector.tobytes())
+    raw[:2] = MAGIC
+    vector = np.frombuffer(bytes(raw), dtype="<f8")
+    blob = EncodingCodec.encode(vector, FORMAT_LEGACY)
+
+    assert blob.startswith(MAGIC)
+    assert EncodingCodec.format_of(blob) == FORMAT_LEGACY
+    np.testing.assert_array_equal(EncodingCodec.decode(blob, np.float64), vector)
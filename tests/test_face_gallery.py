@@ -0,0 +1,89 @@
+import numpy as np
+
+from app.services.encoding_codec import EncodingCodec
+from app.services.face_gallery import FaceGallery
+
+TOLERANCE = 0.6
+
+
+def _encoding(seed):
+    return EncodingCodec.encode(np.random.default_rng(seed).normal(0, 0.1, 128))
+
+
+def _gallery(client_ids):
+    gallery = FaceGallery(initial_capacity=2)
+    gallery.rebuild([(client_id, _encoding(client_id)) for client_id in client_ids])
+    return gallery
+
+
+def test_match_finds_the_enrolled_client():
+    gallery = _gallery(range(1, 6))
+
+    client_id, confidence = gallery.match(_encoding(3), TOLERANCE)
+
+    assert client_id == 3
+    assert confidence > 99
+    assert gallery.match(_encoding(99), TOLERANCE) == (None, 0.0)
+
+
+def test_upsert_replaces_the_clients_encoding():
+    gallery = _gallery(range(1, 6))
+
+    gallery.upsert(3, _encoding(42))
+
+    assert len(gallery) == 5
+    assert gallery.match(_encoding(42), TOLERANCE)[0] == 3
+    assert gallery.match(_encoding(3), TOLERANCE) == (None, 0.0)
+
+
+def test_remove_keeps_the_other_rows_matchable():
+    gallery = _gallery(range(1, 6))
+
+    # Quitar una fila intermedia mueve la última al hueco
+    gallery.remove(2)
+    gallery.remove(404)
+
+    assert len(gallery) == 4
+    assert gallery.match(_encoding(2), TOLERANCE) == (None, 0.0)
+    for client_id in (1, 3, 4, 5):
+        assert gallery.match(_encoding(client_id), TOLERANCE)[0] == client_id
+
+
+def test_match_many_answers_each_probe_in_order():
+    gallery = _gallery(range(1, 6))
+    probes = [_encoding(4), _encoding(99), _encoding(1)]
+
+    results = gallery.match_many(probes, TOLERANCE, with_distance=True)
+
+    assert [client_id for client_id, _, _ in results] == [4, None, 1]
+    assert results[0][2] < 1e-3
+    assert results[1][2] > TOLERANCE
+    assert gallery.match_many([], TOLERANCE) == []
+
+
+def test_site_partition_is_scanned_before_the_whole_gallery():
+    probe = _encoding(7)
+    # Un socio de la sede, algo más lejos que el mejor candidato global
+    nearby = EncodingCodec.decode(probe) + 0.01
+    gallery = FaceGallery()
+    gallery.rebuild(
+        [(1, EncodingCodec.encode(nearby), "south"), (7, probe), (8, _encoding(8))]
+    )
+
+    assert gallery.match(probe, TOLERANCE)[0] == 7
+    assert gallery.match(probe, TOLERANCE, site="south")[0] == 1
+    # Fuera de la sede se recurre a la galería completa
+    assert gallery.match(_encoding(8), TOLERANCE, site="south")[0] == 8
+    assert gallery.match(_encoding(8), TOLERANCE, site="north")[0] == 8
+
+
+def test_upsert_moves_the_client_between_sites():
+    gallery = _gallery(range(1, 4))
+    gallery.upsert(2, _encoding(2), "north")
+    gallery.upsert(2, _encoding(2), "south")
+
+    assert gallery._rows_for_site("north").tolist() == []
+    assert gallery.match(_encoding(2), TOLERANCE, site="south")[0] == 2
+
+    gallery.remove(2)
+    assert gallery._rows_for_site("south").tolist() == []
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from app.services.client_service import ClientService
+from app.services.encoding_codec import EncodingCodec
+from app.services.face_gallery import FaceGallery
+from app.services.gallery_snapshot import GallerySnapshotStore
+
+TOLERANCE = 0.6
+
+
+def _encoding(seed):
+    return EncodingCodec.encode(np.random.default_rng(seed).normal(0, 0.1, 128))
+
+
+@pytest.fixture
+def galleries(tmp_path, monkeypatch):
+    """Two workers sharing one snapshot directory, seeded from the "DB" rows"""
+    rows = [(client_id, _encoding(client_id)) for client_id in range(1, 6)]
+    monkeypatch.setattr(ClientService, "get_gallery_encodings", lambda: rows)
+    workers = []
+    for _ in range(2):
+        gallery = FaceGallery()
+        gallery.use_snapshots(
+            GallerySnapshotStore(str(tmp_path), headroom=4),
+            poll_interval=0,
+            compact_every=3,
+        )
+        gallery.load_from_db()
+        workers.append(gallery)
+    return workers
+
+
+def test_both_workers_map_the_same_version(galleries):
+    writer, reader = galleries
+
+    assert writer._snapshot_version == reader._snapshot_version == 1
+    assert len(reader) == 5
+    assert reader.match(_encoding(4), TOLERANCE)[0] == 4
+
+
+def test_writes_reach_the_other_worker_on_refresh(galleries):
+    writer, reader = galleries
+
+    writer.upsert(10, _encoding(10), "north")
+    writer.remove(2)
+    reader.refresh(force=True)
+
+    assert len(reader) == 5
+    assert reader.match(_encoding(10), TOLERANCE, site="north")[0] == 10
+    assert reader.match(_encoding(2), TOLERANCE) == (None, 0.0)
+
+
+def test_compaction_publishes_a_version_the_other_worker_maps(galleries):
+    writer, reader = galleries
+
+    for client_id in (10, 11, 12):
+        writer.upsert(client_id, _encoding(client_id))
+    reader.refresh(force=True)
+
+    assert writer._snapshot_version == reader._snapshot_version == 2
+    assert reader._delta_count == 0
+    assert len(reader) == 8
+    for client_id in (1, 10, 12):
+        assert reader.match(_encoding(client_id), TOLERANCE)[0] == client_id
@@ -0,0 +1,101 @@
+import io
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from app.utils.helpers import BODY_TOO_LARGE_ERROR, RequestHelper
+
+LIMIT = 1000
+
+
+@pytest.fixture
+def payload(app):
+    app.config["MAX_IMAGE_UPLOAD_BYTES"] = LIMIT
+
+    def read(chunked=False, many=False, **request_args):
+        environ = EnvironBuilder(
+            path="/api/verify-access", method="POST", **request_args
+        ).get_environ()
+        if chunked:
+            # Transfer-Encoding: chunked, sin Content-Length
+            del environ["CONTENT_LENGTH"]
+            environ["wsgi.input_terminated"] = True
+        with app.request_context(environ):
+            image_field = "images" if many else "image"
+            fields, image, error = RequestHelper.get_image_payload(image_field, many)
+            # Los ficheros se cierran al terminar la petición
+            if many and image:
+                image = [item.read() for item in image]
+            elif hasattr(image, "read"):
+                image = image.read()
+            return fields, image, error
+
+    return read
+
+
+def test_json_body(payload):
+    assert payload(json={"image": "data:image/jpeg;base64,AA", "site_id": "1"}) == (
+        {"image": "data:image/jpeg;base64,AA", "site_id": "1"},
+        "data:image/jpeg;base64,AA",
+        None,
+    )
+    assert payload(json=[1, 2])[2] == "JSON body must be an object"
+    assert payload(data="{", content_type="application/json")[2] == "No data provided"
+
+
+def test_raw_body_takes_fields_from_the_query_string(payload):
+    fields, image, error = payload(
+        query_string={"site_id": "1"},
+        data=b"\xff\xd8jpeg",
+        content_type="application/octet-stream",
+    )
+
+    assert (fields, image, error) == ({"site_id": "1"}, b"\xff\xd8jpeg", None)
+
+
+def test_multipart_body(payload):
+    fields, images, error = payload(
+        many=True,
+        data={
+            "site_id": "1",
+            "images": [
+                (io.BytesIO(b"one"), "1.jpg"),
+                (io.BytesIO(b"two"), "2.jpg"),
+            ],
+        },
+    )
+
+    assert fields == {"site_id": "1"}
+    assert images == [b"one", b"two"]
+    assert error is None
+
+
+@pytest.mark.parametrize(
+    "request_args",
+    [
+        {"json": {"image": "x" * LIMIT}},
+        {"data": b"x" * (LIMIT + 1), "content_type": "application/octet-stream"},
+        {"data": {"image": (io.BytesIO(b"x" * LIMIT), "big.jpg")}},
+    ],
+)
+def test_chunked_bodies_over_the_limit(payload, request_args):
+    error = payload(chunked=True, **request_args)[2]
+
+    assert error == BODY_TOO_LARGE_ERROR
+    assert RequestHelper.payload_error_status(error) == 413
+
+
+def test_chunked_body_under_the_limit(payload):
+    assert payload(chunked=True, json={"image": "x" * 10})[1] == "x" * 10
+
+
+def test_sized_body_over_the_limit_is_rejected_before_reading(client, app):
+    app.config["MAX_IMAGE_UPLOAD_BYTES"] = LIMIT
+    response = client.post(
+        "/api/verify-access",
+        data=b"x" * (LIMIT + 1),
+        content_type="application/octet-stream",
+    )
+
+    assert response.status_code == 413
+    assert response.get_json()["message"] == BODY_TOO_LARGE_ERROR
@@ -0,0 +1,65 @@
+from app.services.kiosk_tracker import KioskTracker
+
+BOX = (100, 200, 200, 100)
+MOVED = (300, 400, 400, 300)
+
+
+def _tracker(**kwargs):
+    return KioskTracker(
+        **{"min_votes": 3, "max_frames": 5, "reencode_every": 3, **kwargs}
+    )
+
+
+def _record(tracker, match, box=BOX, encoded=True):
+    return tracker.record("kiosk-1", box, b"thumb", match, encoded)[1]
+
+
+def test_decides_once_when_a_client_reaches_the_votes():
+    tracker = _tracker()
+
+    decisions = [_record(tracker, (7, confidence)) for confidence in (90, 80, 70, 90)]
+
+    assert decisions == [None, None, (7, 80), None]
+
+
+def test_without_consensus_the_most_voted_client_wins_at_max_frames():
+    tracker = _tracker()
+    matches = [(7, 90), (None, 0.0), (7, 70), (8, 60), (None, 0.0)]
+
+    decisions = [_record(tracker, match) for match in matches]
+
+    assert decisions[:4] == [None] * 4
+    assert decisions[4] == (7, 80)
+
+
+def test_a_box_jump_starts_a_new_track():
+    tracker = _tracker()
+    _record(tracker, (7, 90))
+    _record(tracker, (7, 90))
+
+    assert _record(tracker, (7, 90), box=MOVED) is None
+    assert tracker.snapshot("kiosk-1")[0] == MOVED
+
+
+def test_a_new_face_after_the_decision_is_voted_again():
+    tracker = _tracker()
+    for _ in range(3):
+        _record(tracker, (7, 90))
+
+    decisions = [_record(tracker, (8, 85)) for _ in range(3)]
+
+    assert decisions == [None, None, (8, 85)]
+
+
+def test_snapshot_forces_a_reencode_every_few_frames():
+    tracker = _tracker()
+    _record(tracker, (7, 90))
+
+    assert tracker.snapshot("kiosk-1") == (BOX, b"thumb", (7, 90))
+
+    _record(tracker, (7, 90), encoded=False)
+    assert tracker.snapshot("kiosk-1")[1] == b"thumb"
+
+    _record(tracker, (7, 90), encoded=False)
+    assert tracker.snapshot("kiosk-1")[1] is None
+    assert tracker.snapshot("kiosk-2") == (None, None, None)
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from app.services.request_coordinator import (
+    OverloadedError,
+    RateLimitedError,
+    VerifyCoordinator,
+)
+
+
+def _run_concurrently(coordinator, key, fn, callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(coordinator.run(key, fn))
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_identical_requests_are_computed_once():
+    coordinator = VerifyCoordinator()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "match"
+
+    leader, results, _ = _run_concurrently(coordinator, "frame", compute, 1)
+    started.wait(5)
+    followers, follower_results, errors = _run_concurrently(
+        coordinator, "frame", compute, 3
+    )
+    time.sleep(0.2)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results + follower_results == ["match"] * 4
+    assert errors == []
+
+
+def test_followers_get_the_leaders_base_exception():
+    coordinator = VerifyCoordinator()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    leader, _, errors = _run_concurrently(coordinator, "frame", compute, 1)
+    started.wait(5)
+    followers, follower_results, follower_errors = _run_concurrently(
+        coordinator, "frame", compute, 2
+    )
+    time.sleep(0.2)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert follower_results == []
+    assert [type(e) for e in errors + follower_errors] == [KeyboardInterrupt] * 3
+
+
+def test_concurrency_cap_sheds_new_work():
+    coordinator = VerifyCoordinator(max_concurrent=1)
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+
+    threads, _, _ = _run_concurrently(coordinator, None, compute, 1)
+    started.wait(5)
+    with pytest.raises(OverloadedError):
+        coordinator.run(None, lambda: None)
+    release.set()
+    threads[0].join()
+
+
+def test_kiosk_bucket_limits_after_the_burst():
+    coordinator = VerifyCoordinator(rate=1.0, burst=3)
+
+    for _ in range(3):
+        coordinator.admit("kiosk-1")
+    with pytest.raises(RateLimitedError) as excinfo:
+        coordinator.admit("kiosk-1")
+
+    assert excinfo.value.retry_after >= 1
+    # Cada kiosco tiene su propio bucket y los anónimos no se limitan
+    coordinator.admit("kiosk-2")
+    for _ in range(10):
+        coordinator.admit(None)
+
+
+def test_key_covers_payload_and_fields():
+    key = VerifyCoordinator.key_for(b"frame", "site-1")
+
+    assert key == VerifyCoordinator.key_for(b"frame", "site-1")
+    assert key != VerifyCoordinator.key_for(b"frame", "site-2")
+    assert key != VerifyCoordinator.key_for(b"other", "site-1")
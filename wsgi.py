@@ -0,0 +1,5 @@
+from app import create_app
+import os
+
+# gunicorn -c gunicorn.conf.py (wsgi:app)
+app = create_app(os.getenv("FLASK_ENV", "default"))